@@ -0,0 +1 @@
+# Core - Shared API plumbing (renderers, parsers)
@@ -0,0 +1,47 @@
+"""
+Dark Knight Phantom SIEM - Logging Handlers
+Console logging written from a background thread
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+
+class QueuedStreamHandler(logging.handlers.QueueHandler):
+    """
+    StreamHandler whose writes happen on a QueueListener thread,
+    request threads only format the message and enqueue the record
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.target = logging.StreamHandler(stream)
+        self.listener = None
+        self._start_listener()
+        # Threads don't survive fork, so forked workers (gunicorn, the
+        # runserver reloader) need a listener of their own
+        os.register_at_fork(after_in_child=self._restart_listener)
+        # Write out whatever is still queued when the process exits
+        atexit.register(self._stop_listener)
+
+    def _start_listener(self):
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def _restart_listener(self):
+        # The parent's listener thread is gone and its queue may have been
+        # copied mid-write, start over with a fresh queue in the child
+        self.queue = queue.SimpleQueue()
+        self._start_listener()
+
+    def _stop_listener(self):
+        # Enqueues the sentinel and joins the thread once the queue is drained
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def setFormatter(self, fmt):
+        # The listener's handler applies the configured format
+        self.target.setFormatter(fmt)
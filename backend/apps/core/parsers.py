@@ -0,0 +1,18 @@
+"""
+Dark Knight Phantom SIEM - API Parsers
+Fast JSON parsing for large agent batches
+"""
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class ORJSONParser(BaseParser):
+    """JSON parser backed by orjson (always UTF-8, as RFC 8259 requires)"""
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,51 @@
+"""
+Dark Knight Phantom SIEM - API Renderers
+Fast JSON rendering for large event payloads
+"""
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    JSON renderer backed by orjson
+    Serializes datetimes/UUIDs natively and falls back to DRF's encoder
+    for everything else (Decimal, lazy strings, querysets, ...)
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    options = orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_UUID
+
+    _fallback = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=self._fallback, option=self.options)
+
+    def render_stream(self, rows, chunk_size=500):
+        """
+        Encode an iterable of rows as a JSON array, yielding bytes every
+        chunk_size rows for use in a StreamingHttpResponse
+        Returns the number of rows encoded (use with `yield from`)
+        """
+        dumps = orjson.dumps
+        default = self._fallback
+        option = self.options
+        count = 0
+        batch = []
+
+        yield b'['
+        for row in rows:
+            batch.append(dumps(row, default=default, option=option))
+            if len(batch) == chunk_size:
+                yield (b',' if count else b'') + b','.join(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            yield (b',' if count else b'') + b','.join(batch)
+            count += len(batch)
+        yield b']'
+        return count
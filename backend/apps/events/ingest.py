@@ -0,0 +1,95 @@
+"""
+Dark Knight Phantom SIEM - Event Ingestion
+Severity classification and row building for agent event batches
+"""
+from django.db import transaction
+
+from .models import SecurityEvent, EventSource
+
+
+# Critical events
+CRITICAL_EVENT_IDS = frozenset({
+    4697, 4698, 4719, 4720, 4728, 4732, 4756,  # Account/Group changes
+    7045,  # Service installed
+    4688,  # Process creation (needs command line analysis)
+    1102,  # Audit log cleared
+    4662,  # AD object operation (DCSync)
+})
+
+# High severity events
+HIGH_EVENT_IDS = frozenset({
+    4625,  # Failed logon
+    4648,  # Explicit credential logon
+    4672,  # Special privileges assigned
+    4724,  # Password reset attempt
+    4740,  # Account lockout
+    4768, 4769, 4771,  # Kerberos events
+    5140, 5145,  # Share access
+})
+
+# Medium severity events
+MEDIUM_EVENT_IDS = frozenset({
+    4624,  # Successful logon
+    4634,  # Logoff
+    4689,  # Process termination
+    5156,  # Firewall connection
+})
+
+
+def determine_severity(event_data):
+    """Determine event severity based on event ID and content"""
+    event_id = event_data.get('event_id', 0)
+    
+    if event_id in CRITICAL_EVENT_IDS:
+        return 'CRITICAL'
+    elif event_id in HIGH_EVENT_IDS:
+        return 'HIGH'
+    elif event_id in MEDIUM_EVENT_IDS:
+        return 'MEDIUM'
+    elif event_data.get('level', 0) >= 3:  # Warning or Error
+        return 'MEDIUM'
+    return 'INFO'
+
+
+def get_event_source():
+    """Get or create the event source used for agent batches"""
+    source, _ = EventSource.objects.get_or_create(
+        name='Windows Event Log',
+        defaults={'provider': 'PhantomAgent', 'description': 'Windows Event Log collected by Phantom Agent'}
+    )
+    return source
+
+
+def build_events(events_data, source, agent_id, agent_ip):
+    """
+    Build unsaved SecurityEvent objects from a validated agent batch
+    EventIngestSerializer fills in every optional field, so each event
+    dict maps 1:1 onto SecurityEvent columns
+    """
+    return [
+        SecurityEvent(
+            source=source,
+            agent_id=agent_id,
+            ip_address=agent_ip,
+            severity=determine_severity(event_data),
+            domain=event_data['user_domain'],
+            **event_data
+        )
+        for event_data in events_data
+    ]
+
+
+def store_events(events):
+    """Bulk insert built events, returns the created objects"""
+    with transaction.atomic():
+        return SecurityEvent.objects.bulk_create(events, batch_size=1000)
+
+
+def run_detection(events):
+    """Run stored events through the detection engine, returns alerts created"""
+    from apps.detection.engine import process_event_detection
+    
+    alerts_created = 0
+    for event in events:
+        alerts_created += len(process_event_detection(event))
+    return alerts_created
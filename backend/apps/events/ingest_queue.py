@@ -0,0 +1,69 @@
+"""
+Dark Knight Phantom SIEM - Ingest Queue
+Write-behind queue for agent batches backed by a Redis stream,
+drained by `manage.py consume_event_stream`
+"""
+import redis
+from django.conf import settings
+
+STREAM = 'events:stream'
+GROUP = 'ingest'
+# Batches that failed MAX_DELIVERIES times are moved here for inspection
+DEAD_LETTER_STREAM = 'events:dead'
+MAX_DELIVERIES = 5
+
+_client = None
+
+
+def get_client():
+    """Get the shared Redis client"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.PHANTOM_SIEM['INGEST_QUEUE_URL'])
+    return _client
+
+
+def enqueue(raw_body, agent_id):
+    """Append a raw agent batch to the stream, returns the entry id"""
+    return get_client().xadd(STREAM, {'body': raw_body, 'agent_id': agent_id})
+
+
+def ensure_group():
+    """Create the consumer group (and stream) if it doesn't exist yet"""
+    try:
+        get_client().xgroup_create(STREAM, GROUP, id='0', mkstream=True)
+    except redis.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def read_batches(consumer, count=10, block_ms=5000, start='>'):
+    """
+    Read queued batches for a consumer as (entry_id, fields) pairs
+    start='>' reads new entries, any other id re-reads this consumer's
+    pending (delivered but never acked) entries after that id
+    """
+    response = get_client().xreadgroup(GROUP, consumer, {STREAM: start}, count=count, block=block_ms)
+    if not response:
+        return []
+    return response[0][1]
+
+
+def delivery_count(entry_id):
+    """How many times an unacked entry has been delivered to the group"""
+    pending = get_client().xpending_range(STREAM, GROUP, min=entry_id, max=entry_id, count=1)
+    return pending[0]['times_delivered'] if pending else 0
+
+
+def dead_letter(entry_id, fields, error):
+    """Copy an entry that keeps failing to the dead-letter stream, then ack it"""
+    get_client().xadd(DEAD_LETTER_STREAM, {**fields, 'entry_id': entry_id, 'error': error})
+    ack([entry_id])
+
+
+def ack(entry_ids):
+    """Acknowledge processed entries and drop them from the stream"""
+    if entry_ids:
+        client = get_client()
+        client.xack(STREAM, GROUP, *entry_ids)
+        client.xdel(STREAM, *entry_ids)
@@ -0,0 +1,130 @@
+"""
+Dark Knight Phantom SIEM - Ingest Stream Consumer
+Validates and stores agent batches queued by the ingest endpoint
+"""
+import logging
+import socket
+import time
+
+import orjson
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.events import ingest_queue
+from apps.events.ingest import build_events, get_event_source, run_detection, store_events
+from apps.events.serializers import BulkIngestSerializer
+
+logger = logging.getLogger(__name__)
+
+RETRY_INTERVAL = 30  # seconds between passes over unacked entries
+MAX_BACKOFF = 30  # seconds
+
+
+class Command(BaseCommand):
+    help = 'Store agent batches queued on the Redis ingest stream'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', default=None,
+                            help='Consumer name within the group (default: hostname)')
+        parser.add_argument('--count', type=int, default=10,
+                            help='Maximum agent batches per read (default: 10)')
+        parser.add_argument('--block', type=int, default=5000,
+                            help='Milliseconds to wait for new batches (default: 5000)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the stream is empty')
+
+    def handle(self, *args, **options):
+        consumer = options['consumer'] or socket.gethostname()
+        ingest_queue.ensure_group()
+
+        # Entries delivered to this consumer but never acked get one pass
+        # at startup and another every RETRY_INTERVAL. Each pass walks the
+        # pending list once from the start, so entries that keep failing
+        # can't hold the consumer back from new batches
+        start = '0'
+        next_pass = 0
+        backoff = 1
+        while True:
+            close_old_connections()
+            entries = ingest_queue.read_batches(
+                consumer, count=options['count'], block_ms=options['block'], start=start
+            )
+
+            if start != '>':
+                if entries:
+                    # Continue the pass after the last pending entry seen
+                    start = entries[-1][0]
+                else:
+                    start = '>'
+                    next_pass = time.monotonic() + RETRY_INTERVAL
+                    continue
+
+            if entries and self.process(entries):
+                # Failing batches usually mean the database is unavailable
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+            else:
+                backoff = 1
+
+            if start == '>':
+                if not entries and options['once']:
+                    break
+                if time.monotonic() >= next_pass:
+                    start = '0'
+
+    def process(self, entries):
+        """Store queued batches, returns how many failed and stay pending"""
+        try:
+            source = get_event_source()
+        except Exception as e:
+            # Database unavailable, leave the whole read pending for the backoff and retry
+            logger.error(f"Error looking up the event source: {e}")
+            return len(entries)
+
+        done = []
+        failed = 0
+
+        for entry_id, fields in entries:
+            if not fields:
+                # Pending entry whose stream data was already deleted
+                done.append(entry_id)
+                continue
+
+            try:
+                payload = orjson.loads(fields[b'body'])
+                serializer = BulkIngestSerializer(data=payload)
+                if not serializer.is_valid():
+                    # Invalid batches would fail on every retry - drop them
+                    logger.warning(f"Dropping invalid queued batch {entry_id}: {serializer.errors}")
+                    done.append(entry_id)
+                    continue
+
+                data = serializer.validated_data
+                events = build_events(data['events'], source, data['agent_id'], data.get('agent_ip'))
+                created_events = store_events(events)
+                done.append(entry_id)
+                logger.info(f"Ingested {len(created_events)} queued events from agent {data['agent_id']}")
+            except orjson.JSONDecodeError as e:
+                logger.warning(f"Dropping unparseable queued batch {entry_id}: {e}")
+                done.append(entry_id)
+                continue
+            except Exception as e:
+                # Left unacked for the next pending pass, until it has been
+                # delivered MAX_DELIVERIES times
+                logger.error(f"Error ingesting queued batch {entry_id}: {e}")
+                failed += 1
+                if ingest_queue.delivery_count(entry_id) >= ingest_queue.MAX_DELIVERIES:
+                    logger.error(f"Dead-lettering queued batch {entry_id} after "
+                                 f"{ingest_queue.MAX_DELIVERIES} attempts")
+                    ingest_queue.dead_letter(entry_id, fields, str(e))
+                continue
+
+            try:
+                alerts_created = run_detection(created_events)
+                if alerts_created > 0:
+                    logger.warning(f"Detection engine created {alerts_created} alerts from batch")
+            except Exception as det_error:
+                logger.error(f"Detection engine error: {det_error}")
+
+        ingest_queue.ack(done)
+        return failed
@@ -0,0 +1,56 @@
+"""
+Dark Knight Phantom SIEM - Staging Drain Worker
+Periodically moves staged events into security_events and runs detection
+"""
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.events.ingest import run_detection
+from apps.events.models import SecurityEvent
+from apps.events.staging import drain_staging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Move events from the UNLOGGED staging table into security_events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds between drains (default: 5)')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain a single time and exit')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        while True:
+            close_old_connections()
+            try:
+                self.drain()
+            except Exception as e:
+                logger.error(f"Error draining staged events: {e}")
+                if options['once']:
+                    raise
+
+            if options['once']:
+                break
+            time.sleep(interval)
+
+    def drain(self):
+        event_ids = drain_staging()
+        if not event_ids:
+            return
+
+        try:
+            alerts_created = 0
+            for start in range(0, len(event_ids), 1000):
+                events = SecurityEvent.objects.filter(id__in=event_ids[start:start + 1000]).order_by('id')
+                alerts_created += run_detection(events)
+            if alerts_created > 0:
+                logger.warning(f"Detection engine created {alerts_created} alerts from staged events")
+        except Exception as det_error:
+            logger.error(f"Detection engine error: {det_error}")
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        # Same columns as security_events (minus the id, assigned on drain) but
+        # UNLOGGED and index-free, so COPY skips WAL and index maintenance
+        migrations.RunSQL(
+            sql=[
+                'CREATE UNLOGGED TABLE security_events_staging (LIKE security_events INCLUDING DEFAULTS)',
+                'ALTER TABLE security_events_staging DROP COLUMN id',
+            ],
+            reverse_sql='DROP TABLE security_events_staging',
+        ),
+    ]
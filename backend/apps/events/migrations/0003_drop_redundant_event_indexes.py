@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-15 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_security_events_staging'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='securityevent',
+            name='agent_id',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='securityevent',
+            name='channel',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='securityevent',
+            name='event_id',
+            field=models.IntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='securityevent',
+            name='hostname',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='securityevent',
+            name='process_name',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='securityevent',
+            name='severity',
+            field=models.CharField(choices=[('INFO', 'Informational'), ('LOW', 'Low'), ('MEDIUM', 'Medium'), ('HIGH', 'High'), ('CRITICAL', 'Critical')], default='INFO', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='securityevent',
+            name='source_ip',
+            field=models.GenericIPAddressField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='securityevent',
+            name='user_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-15 11:53
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_drop_redundant_event_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='securityevent',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('hostname'), name='gin_trgm_ops'), name='se_hostname_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='securityevent',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('user_name'), name='gin_trgm_ops'), name='se_user_name_trgm'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-15 11:57
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='securityevent',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('message'), name='gin_trgm_ops'), name='se_message_trgm'),
+        ),
+    ]
@@ -2,7 +2,9 @@
 Dark Knight Phantom SIEM - Event Models
 Comprehensive Windows Event Log storage with FULL event data
 """
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 import json
 
@@ -81,7 +83,7 @@ class SecurityEvent(models.Model):
     ]
     
     # Event Identification
-    event_id = models.IntegerField(db_index=True)
+    event_id = models.IntegerField()
     event_record_id = models.BigIntegerField(null=True, blank=True)
     correlation_id = models.UUIDField(null=True, blank=True, db_index=True)
     
@@ -91,21 +93,21 @@ class SecurityEvent(models.Model):
     
     # Source Information
     source = models.ForeignKey(EventSource, on_delete=models.SET_NULL, null=True, related_name='events')
-    channel = models.CharField(max_length=255, db_index=True)  # Security, System, Application, etc.
+    channel = models.CharField(max_length=255)  # Security, System, Application, etc.
     provider_name = models.CharField(max_length=255, db_index=True)
     provider_guid = models.CharField(max_length=50, blank=True)
     
     # Host Information
-    hostname = models.CharField(max_length=255, db_index=True)
+    hostname = models.CharField(max_length=255)
     domain = models.CharField(max_length=255, blank=True, db_index=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True, db_index=True)
     
     # Agent Information
-    agent_id = models.CharField(max_length=100, db_index=True)
+    agent_id = models.CharField(max_length=100)
     
     # Event Classification
     category = models.ForeignKey(EventCategory, on_delete=models.SET_NULL, null=True)
-    severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, default='INFO', db_index=True)
+    severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, default='INFO')
     level = models.IntegerField(default=0)  # Windows Event Level (0-5)
     level_name = models.CharField(max_length=50, blank=True)  # Information, Warning, Error, etc.
     task = models.IntegerField(default=0)
@@ -122,7 +124,7 @@ class SecurityEvent(models.Model):
     system_data = models.JSONField(default=dict, blank=True)  # System metadata
     
     # User Information (extracted for quick queries)
-    user_name = models.CharField(max_length=255, blank=True, db_index=True)
+    user_name = models.CharField(max_length=255, blank=True)
     user_domain = models.CharField(max_length=255, blank=True)
     user_sid = models.CharField(max_length=100, blank=True, db_index=True)
     target_user_name = models.CharField(max_length=255, blank=True, db_index=True)
@@ -131,7 +133,7 @@ class SecurityEvent(models.Model):
     
     # Process Information (for process events)
     process_id = models.IntegerField(null=True, blank=True, db_index=True)
-    process_name = models.CharField(max_length=500, blank=True, db_index=True)
+    process_name = models.CharField(max_length=500, blank=True)
     process_path = models.TextField(blank=True)
     command_line = models.TextField(blank=True)
     parent_process_id = models.IntegerField(null=True, blank=True)
@@ -139,7 +141,7 @@ class SecurityEvent(models.Model):
     parent_command_line = models.TextField(blank=True)
     
     # Network Information (for network events)
-    source_ip = models.GenericIPAddressField(null=True, blank=True, db_index=True)
+    source_ip = models.GenericIPAddressField(null=True, blank=True)
     source_port = models.IntegerField(null=True, blank=True)
     destination_ip = models.GenericIPAddressField(null=True, blank=True, db_index=True)
     destination_port = models.IntegerField(null=True, blank=True)
@@ -196,6 +198,9 @@ class SecurityEvent(models.Model):
     class Meta:
         db_table = 'security_events'
         ordering = ['-timestamp']
+        # Each composite also serves lookups on its leading column, so those
+        # columns carry no single-column index of their own - every index
+        # here is maintained on every ingested row
         indexes = [
             models.Index(fields=['event_id', 'timestamp']),
             models.Index(fields=['hostname', 'timestamp']),
@@ -205,6 +210,14 @@ class SecurityEvent(models.Model):
             models.Index(fields=['process_name', 'timestamp']),
             models.Index(fields=['source_ip', 'timestamp']),
             models.Index(fields=['agent_id', 'timestamp']),
+            # Trigram indexes for the icontains filters. Django compiles
+            # icontains to UPPER(col) LIKE UPPER(...), so index that expression
+            GinIndex(OpClass(Upper('hostname'), name='gin_trgm_ops'), name='se_hostname_trgm'),
+            GinIndex(OpClass(Upper('user_name'), name='gin_trgm_ops'), name='se_user_name_trgm'),
+            # PQL "message CONTAINS" searches this column. raw_xml, event_data
+            # and full_text hold multi-KB payloads whose trigram indexes would
+            # cost every ingested row far more, so CONTAINS on those scans
+            GinIndex(OpClass(Upper('message'), name='gin_trgm_ops'), name='se_message_trgm'),
         ]
     
     def __str__(self):
@@ -0,0 +1,99 @@
+"""
+Dark Knight Phantom SIEM - Event Staging
+COPY-based ingestion into an UNLOGGED staging table, drained into
+security_events by a background worker (see drain_event_staging)
+"""
+import io
+import json
+import logging
+
+from django.db import connection, models, transaction
+
+from .models import SecurityEvent
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE = 'security_events_staging'
+
+# COPY text format escapes (backslash first so the others aren't doubled)
+_COPY_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+})
+
+
+def _text(value):
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def _json(value):
+    return json.dumps(value).translate(_COPY_ESCAPES)
+
+
+def _bool(value):
+    return 't' if value else 'f'
+
+
+def _datetime(value):
+    return value.isoformat()
+
+
+def _converter(field):
+    """Pick the COPY text encoder for a model field"""
+    if isinstance(field, models.JSONField):
+        return _json
+    if isinstance(field, models.BooleanField):
+        return _bool
+    if isinstance(field, models.DateTimeField):
+        return _datetime
+    return _text
+
+
+# Every SecurityEvent column except the primary key, which is assigned
+# when rows are moved into security_events
+STAGING_FIELDS = [f for f in SecurityEvent._meta.concrete_fields if not f.primary_key]
+STAGING_COLUMNS = ', '.join(connection.ops.quote_name(f.column) for f in STAGING_FIELDS)
+_ENCODERS = [(f.attname, _converter(f)) for f in STAGING_FIELDS]
+
+
+def copy_to_staging(events):
+    """Stream unsaved SecurityEvent objects into the staging table with COPY"""
+    buf = io.StringIO()
+    write = buf.write
+    for event in events:
+        row = []
+        for attname, encode in _ENCODERS:
+            value = getattr(event, attname)
+            row.append('\\N' if value is None else encode(value))
+        write('\t'.join(row))
+        write('\n')
+
+    # psycopg 3 COPY: the whole text-format payload is sent in one write
+    with connection.cursor() as cursor:
+        with cursor.copy(f'COPY {STAGING_TABLE} ({STAGING_COLUMNS}) FROM STDIN') as copy:
+            copy.write(buf.getvalue())
+
+    return len(events)
+
+
+def drain_staging():
+    """
+    Move staged rows into security_events in one transaction
+    Returns the ids of the moved events
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Block concurrent COPYs so TRUNCATE can't drop rows the INSERT didn't see
+            cursor.execute(f'LOCK TABLE {STAGING_TABLE} IN EXCLUSIVE MODE')
+            cursor.execute(
+                f'INSERT INTO {SecurityEvent._meta.db_table} ({STAGING_COLUMNS}) '
+                f'SELECT {STAGING_COLUMNS} FROM {STAGING_TABLE} RETURNING id'
+            )
+            event_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(f'TRUNCATE {STAGING_TABLE}')
+
+    if event_ids:
+        logger.info(f"Moved {len(event_ids)} staged events into {SecurityEvent._meta.db_table}")
+    return event_ids
@@ -0,0 +1,147 @@
+"""
+Dark Knight Phantom SIEM - Event Tests
+"""
+from unittest import mock
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .management.commands.consume_event_stream import Command as ConsumeEventStreamCommand
+from .models import SecurityEvent
+from .staging import STAGING_TABLE, copy_to_staging, drain_staging
+
+
+STAGING_SETTINGS = {**settings.PHANTOM_SIEM, 'INGEST_MODE': 'staging'}
+QUEUE_SETTINGS = {**settings.PHANTOM_SIEM, 'INGEST_MODE': 'queue'}
+
+
+class StagingIngestTests(TestCase):
+    """COPY ingestion into the staging table and the drain into security_events"""
+
+    def _staged_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {STAGING_TABLE}')
+            return cursor.fetchone()[0]
+
+    def test_copy_round_trips_values_through_drain(self):
+        now = timezone.now()
+        events = [
+            SecurityEvent(
+                event_id=4625,
+                timestamp=now,
+                channel='Security',
+                provider_name='Microsoft-Windows-Security-Auditing',
+                hostname='DC01',
+                agent_id='agent-1',
+                message='tab\there\nnew line \\ backslash é',
+                event_data={'TargetUserName': 'bob', 'Nested': {'a': [1, 2]}},
+                source_ip='10.0.0.5',
+                is_alerted=True,
+            ),
+            SecurityEvent(
+                event_id=4624,
+                timestamp=now,
+                channel='Security',
+                provider_name='Microsoft-Windows-Security-Auditing',
+                hostname='WS02',
+                agent_id='agent-1',
+            ),
+        ]
+
+        self.assertEqual(copy_to_staging(events), 2)
+        self.assertEqual(self._staged_count(), 2)
+
+        event_ids = drain_staging()
+        self.assertEqual(len(event_ids), 2)
+        self.assertEqual(self._staged_count(), 0)
+
+        stored = {event.hostname: event for event in SecurityEvent.objects.filter(id__in=event_ids)}
+        first = stored['DC01']
+        self.assertEqual(first.message, 'tab\there\nnew line \\ backslash é')
+        self.assertEqual(first.event_data, {'TargetUserName': 'bob', 'Nested': {'a': [1, 2]}})
+        self.assertEqual(first.source_ip, '10.0.0.5')
+        self.assertEqual(first.timestamp, now)
+        self.assertTrue(first.is_alerted)
+        self.assertIsNone(stored['WS02'].source_ip)
+
+    @override_settings(PHANTOM_SIEM=STAGING_SETTINGS)
+    def test_ingest_endpoint_stages_events(self):
+        response = self.client.post('/api/v1/events/ingest/', {
+            'agent_id': 'agent-1',
+            'agent_hostname': 'WS02',
+            'agent_ip': '10.0.0.9',
+            'batch_timestamp': timezone.now().isoformat(),
+            'events': [{
+                'event_id': 4688,
+                'timestamp': timezone.now().isoformat(),
+                'channel': 'Security',
+                'hostname': 'WS02',
+                'command_line': 'cmd.exe /c "echo\thi"',
+            }],
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(self._staged_count(), 1)
+
+
+class ConsumeEventStreamTests(TestCase):
+    """Failure handling of the Redis ingest stream consumer"""
+
+    def test_database_error_leaves_batches_pending(self):
+        entries = [
+            (b'1-0', {b'body': b'{}', b'agent_id': b'agent-1'}),
+            (b'2-0', {b'body': b'{}', b'agent_id': b'agent-1'}),
+        ]
+
+        with mock.patch('apps.events.management.commands.consume_event_stream.get_event_source',
+                        side_effect=OperationalError('connection refused')), \
+                mock.patch('apps.events.ingest_queue.ack') as ack:
+            failed = ConsumeEventStreamCommand().process(entries)
+
+        self.assertEqual(failed, 2)
+        ack.assert_not_called()
+
+
+@override_settings(PHANTOM_SIEM=QUEUE_SETTINGS)
+class QueuedIngestTests(TestCase):
+    """Envelope checks on the queue-mode ingest endpoint"""
+
+    def batch(self, **overrides):
+        return {
+            'agent_id': 'agent-1',
+            'agent_hostname': 'WS02',
+            'agent_ip': '10.0.0.9',
+            'batch_timestamp': timezone.now().isoformat(),
+            'events': [{'event_id': 4688}],
+            **overrides,
+        }
+
+    def post(self, body):
+        return self.client.post('/api/v1/events/ingest/', body, content_type='application/json')
+
+    def test_valid_envelope_is_queued(self):
+        with mock.patch('apps.events.ingest_queue.enqueue') as enqueue:
+            response = self.post(self.batch())
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(enqueue.call_args.args[1], 'agent-1')
+
+    def test_malformed_envelope_is_rejected(self):
+        cases = {
+            'agent_id': {'id': 1},
+            'agent_hostname': ['WS02'],
+            'agent_ip': 'not-an-ip',
+            'events': {'event_id': 4688},
+        }
+        for field, value in cases.items():
+            with self.subTest(field=field), mock.patch('apps.events.ingest_queue.enqueue') as enqueue:
+                response = self.post(self.batch(**{field: value}))
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['error'], 'Invalid data')
+                self.assertIn(field, response.json()['details'])
+                enqueue.assert_not_called()
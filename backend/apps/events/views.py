@@ -6,9 +6,9 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Count, Q
-from django.db import transaction
+from django.db.models import Count, F, Q
 from datetime import timedelta
 import logging
 
@@ -21,7 +21,12 @@ from .serializers import (
     EventCategorySerializer,
     BulkIngestSerializer,
     EventIngestSerializer,
+    IngestEnvelopeSerializer,
+    LIST_FIELDS,
 )
+from . import ingest_queue
+from .ingest import build_events, get_event_source, run_detection, store_events
+from .staging import copy_to_staging
 
 logger = logging.getLogger(__name__)
 
@@ -50,45 +55,32 @@ class SecurityEventViewSet(viewsets.ModelViewSet):
     ordering_fields = ['timestamp', 'event_id', 'hostname', 'severity']
     ordering = ['-timestamp']
     
+    # Query param -> ORM lookup for the manual filters
+    FILTER_LOOKUPS = (
+        ('event_id', 'event_id'),
+        ('hostname', 'hostname__icontains'),
+        ('channel', 'channel'),
+        ('severity', 'severity'),
+        ('agent_id', 'agent_id'),
+        ('user_name', 'user_name__icontains'),
+        ('source_ip', 'source_ip'),
+        ('timestamp__gte', 'timestamp__gte'),
+        ('timestamp__lte', 'timestamp__lte'),
+    )
+    
     def get_queryset(self):
         queryset = super().get_queryset()
         
-        # Manual filtering
-        event_id = self.request.query_params.get('event_id')
-        if event_id:
-            queryset = queryset.filter(event_id=event_id)
-        
-        hostname = self.request.query_params.get('hostname')
-        if hostname:
-            queryset = queryset.filter(hostname__icontains=hostname)
-        
-        channel = self.request.query_params.get('channel')
-        if channel:
-            queryset = queryset.filter(channel=channel)
-        
-        severity = self.request.query_params.get('severity')
-        if severity:
-            queryset = queryset.filter(severity=severity)
-        
-        agent_id = self.request.query_params.get('agent_id')
-        if agent_id:
-            queryset = queryset.filter(agent_id=agent_id)
-        
-        user_name = self.request.query_params.get('user_name')
-        if user_name:
-            queryset = queryset.filter(user_name__icontains=user_name)
-        
-        source_ip = self.request.query_params.get('source_ip')
-        if source_ip:
-            queryset = queryset.filter(source_ip=source_ip)
-        
-        timestamp_gte = self.request.query_params.get('timestamp__gte')
-        if timestamp_gte:
-            queryset = queryset.filter(timestamp__gte=timestamp_gte)
+        # Manual filtering - collected into a single filter() call
+        params = self.request.query_params
+        lookups = {}
+        for param, lookup in self.FILTER_LOOKUPS:
+            value = params.get(param)
+            if value:
+                lookups[lookup] = value
         
-        timestamp_lte = self.request.query_params.get('timestamp__lte')
-        if timestamp_lte:
-            queryset = queryset.filter(timestamp__lte=timestamp_lte)
+        if lookups:
+            queryset = queryset.filter(**lookups)
         
         return queryset
     
@@ -99,13 +91,16 @@ class SecurityEventViewSet(viewsets.ModelViewSet):
             return SecurityEventCreateSerializer
         return SecurityEventSerializer
     
+    def _list_rows(self, queryset):
+        """Project a queryset to list-view dicts, skipping the DRF serializer"""
+        return queryset.values(*LIST_FIELDS, source_name=F('source__name'))
+    
     @action(detail=False, methods=['get'])
     def recent(self, request):
         """Get recent events (last hour)"""
         one_hour_ago = timezone.now() - timedelta(hours=1)
-        events = self.queryset.filter(timestamp__gte=one_hour_ago)[:100]
-        serializer = SecurityEventListSerializer(events, many=True)
-        return Response(serializer.data)
+        events = self._list_rows(self.queryset.filter(timestamp__gte=one_hour_ago))[:100]
+        return Response(list(events))
     
     @action(detail=False, methods=['get'])
     def by_severity(self, request):
@@ -114,12 +109,11 @@ class SecurityEventViewSet(viewsets.ModelViewSet):
         hours = int(request.query_params.get('hours', 24))
         since = timezone.now() - timedelta(hours=hours)
         
-        events = self.queryset.filter(
+        events = self._list_rows(self.queryset.filter(
             severity=severity,
             timestamp__gte=since
-        )[:500]
-        serializer = SecurityEventListSerializer(events, many=True)
-        return Response(serializer.data)
+        ))[:500]
+        return Response(list(events))
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
@@ -168,6 +162,9 @@ class EventIngestView(APIView):
         """
         Ingest a batch of events from an agent
         """
+        if settings.PHANTOM_SIEM.get('INGEST_MODE') == 'queue':
+            return self._enqueue(request)
+        
         serializer = BulkIngestSerializer(data=request.data)
         
         if not serializer.is_valid():
@@ -184,98 +181,33 @@ class EventIngestView(APIView):
         events_data = data['events']
         
         # Get or create event source
-        source, _ = EventSource.objects.get_or_create(
-            name='Windows Event Log',
-            defaults={'provider': 'PhantomAgent', 'description': 'Windows Event Log collected by Phantom Agent'}
-        )
+        source = get_event_source()
         
         # Build event objects
-        events_to_create = []
-        for event_data in events_data:
-            # Determine severity based on event characteristics
-            severity = self._determine_severity(event_data)
-            
-            event = SecurityEvent(
-                event_id=event_data['event_id'],
-                event_record_id=event_data.get('event_record_id'),
-                timestamp=event_data['timestamp'],
-                source=source,
-                channel=event_data['channel'],
-                provider_name=event_data.get('provider_name', ''),
-                provider_guid=event_data.get('provider_guid', ''),
-                hostname=event_data['hostname'],
-                domain=event_data.get('user_domain', ''),
-                ip_address=agent_ip,
-                agent_id=agent_id,
-                severity=severity,
-                level=event_data.get('level', 0),
-                level_name=event_data.get('level_name', ''),
-                task=event_data.get('task', 0),
-                task_name=event_data.get('task_name', ''),
-                opcode=event_data.get('opcode', 0),
-                opcode_name=event_data.get('opcode_name', ''),
-                keywords=event_data.get('keywords', ''),
-                message=event_data.get('message', ''),
-                raw_xml=event_data.get('raw_xml', ''),
-                event_data=event_data.get('event_data', {}),
-                user_data=event_data.get('user_data', {}),
-                system_data=event_data.get('system_data', {}),
-                user_name=event_data.get('user_name', ''),
-                user_domain=event_data.get('user_domain', ''),
-                user_sid=event_data.get('user_sid', ''),
-                target_user_name=event_data.get('target_user_name', ''),
-                target_user_domain=event_data.get('target_user_domain', ''),
-                target_user_sid=event_data.get('target_user_sid', ''),
-                process_id=event_data.get('process_id'),
-                process_name=event_data.get('process_name', ''),
-                process_path=event_data.get('process_path', ''),
-                command_line=event_data.get('command_line', ''),
-                parent_process_id=event_data.get('parent_process_id'),
-                parent_process_name=event_data.get('parent_process_name', ''),
-                parent_command_line=event_data.get('parent_command_line', ''),
-                source_ip=event_data.get('source_ip'),
-                source_port=event_data.get('source_port'),
-                destination_ip=event_data.get('destination_ip'),
-                destination_port=event_data.get('destination_port'),
-                protocol=event_data.get('protocol', ''),
-                logon_type=event_data.get('logon_type'),
-                logon_type_name=event_data.get('logon_type_name', ''),
-                logon_id=event_data.get('logon_id', ''),
-                authentication_package=event_data.get('authentication_package', ''),
-                workstation_name=event_data.get('workstation_name', ''),
-                object_name=event_data.get('object_name', ''),
-                object_type=event_data.get('object_type', ''),
-                access_mask=event_data.get('access_mask', ''),
-                service_name=event_data.get('service_name', ''),
-                service_type=event_data.get('service_type', ''),
-                service_start_type=event_data.get('service_start_type', ''),
-                service_account=event_data.get('service_account', ''),
-                object_dn=event_data.get('object_dn', ''),
-                object_guid=event_data.get('object_guid', ''),
-                object_class=event_data.get('object_class', ''),
-                file_hash_md5=event_data.get('file_hash_md5', ''),
-                file_hash_sha1=event_data.get('file_hash_sha1', ''),
-                file_hash_sha256=event_data.get('file_hash_sha256', ''),
-                status=event_data.get('status', ''),
-                status_code=event_data.get('status_code', ''),
-                failure_reason=event_data.get('failure_reason', ''),
-            )
-            events_to_create.append(event)
+        events_to_create = build_events(events_data, source, agent_id, agent_ip)
         
         # Bulk insert for performance
         try:
-            with transaction.atomic():
-                created_events = SecurityEvent.objects.bulk_create(events_to_create, batch_size=1000)
+            if settings.PHANTOM_SIEM.get('INGEST_MODE') == 'staging':
+                # COPY into the UNLOGGED staging table - drain_event_staging
+                # moves the rows into security_events and runs detection
+                staged = copy_to_staging(events_to_create)
+                logger.info(f"Staged {staged} events from agent {agent_id}")
+                return Response({
+                    'status': 'accepted',
+                    'message': f'Staged {staged} events',
+                    'agent_id': agent_id,
+                    'count': staged,
+                }, status=status.HTTP_202_ACCEPTED)
+            
+            created_events = store_events(events_to_create)
             
             logger.info(f"Ingested {len(created_events)} events from agent {agent_id}")
             
             # Run detection engine on ingested events
             alerts_created = 0
             try:
-                from apps.detection.engine import process_event_detection
-                for event in created_events:
-                    alerts = process_event_detection(event)
-                    alerts_created += len(alerts)
+                alerts_created = run_detection(created_events)
                 
                 if alerts_created > 0:
                     logger.warning(f"Detection engine created {alerts_created} alerts from batch")
@@ -297,49 +229,40 @@ class EventIngestView(APIView):
                 'message': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    def _determine_severity(self, event_data):
-        """Determine event severity based on event ID and content"""
-        event_id = event_data.get('event_id', 0)
+    def _enqueue(self, request):
+        """
+        Write-behind path: check the envelope, queue the raw body and return
+        202 - consume_event_stream validates the events and stores the batch
+        """
+        # Read before request.data consumes the stream
+        raw_body = request.body
+        serializer = IngestEnvelopeSerializer(data=request.data)
         
-        # Critical events
-        critical_events = [
-            4697, 4698, 4719, 4720, 4728, 4732, 4756,  # Account/Group changes
-            7045,  # Service installed
-            4688,  # Process creation (needs command line analysis)
-            1102,  # Audit log cleared
-            4662,  # AD object operation (DCSync)
-        ]
+        if not serializer.is_valid():
+            logger.warning(f"Invalid event batch: {serializer.errors}")
+            return Response(
+                {'error': 'Invalid data', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # High severity events
-        high_events = [
-            4625,  # Failed logon
-            4648,  # Explicit credential logon
-            4672,  # Special privileges assigned
-            4724,  # Password reset attempt
-            4740,  # Account lockout
-            4768, 4769, 4771,  # Kerberos events
-            5140, 5145,  # Share access
-        ]
+        agent_id = serializer.validated_data['agent_id']
+        events = serializer.validated_data['events']
         
-        # Medium severity events  
-        medium_events = [
-            4624,  # Successful logon
-            4634,  # Logoff
-            4688,  # Process creation
-            4689,  # Process termination
-            5156,  # Firewall connection
-        ]
+        try:
+            ingest_queue.enqueue(raw_body, agent_id)
+        except Exception as e:
+            logger.error(f"Error queueing events: {str(e)}")
+            return Response({
+                'status': 'error',
+                'message': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-        if event_id in critical_events:
-            return 'CRITICAL'
-        elif event_id in high_events:
-            return 'HIGH'
-        elif event_id in medium_events:
-            return 'MEDIUM'
-        elif event_data.get('level', 0) >= 3:  # Warning or Error
-            return 'MEDIUM'
-        else:
-            return 'INFO'
+        return Response({
+            'status': 'accepted',
+            'message': f'Queued {len(events)} events',
+            'agent_id': agent_id,
+            'count': len(events),
+        }, status=status.HTTP_202_ACCEPTED)
 
 
 class SingleEventIngestView(APIView):
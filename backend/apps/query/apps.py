@@ -6,5 +6,13 @@ class QueryConfig(AppConfig):
     name = 'apps.query'
     verbose_name = 'PQL Query Engine'
 
+    def ready(self):
+        # Build the PQL field lookups once here, before request threads
+        # can race to populate them on their first query
+        from .pql_engine import _default_fields, _selectable_fields, _valid_fields
+        _valid_fields()
+        _selectable_fields()
+        _default_fields()
+
 
 
@@ -0,0 +1,147 @@
+"""
+Dark Knight Phantom SIEM - Query History Queue
+Write-behind buffer for QueryHistory rows, bulk inserted by a background thread
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.db import close_old_connections
+
+from .models import QueryHistory
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 0.5  # seconds
+BATCH_SIZE = 1000
+MAX_QUEUED = 10000
+DEDUP_WINDOW = 1.0  # seconds
+
+_queue = queue.Queue(maxsize=MAX_QUEUED)
+_worker = None
+# Queued at exit, the writer finishes its current batch and returns
+_STOP = object()
+_worker_lock = threading.Lock()
+
+# (query, was_successful) -> when it was last queued, for dropping repeats
+_recent = {}
+_recent_lock = threading.Lock()
+
+
+def _is_repeat(entry):
+    """True when the same query with the same outcome was queued within DEDUP_WINDOW"""
+    key = (entry.query, entry.was_successful)
+    now = time.monotonic()
+    with _recent_lock:
+        last = _recent.get(key)
+        if last is not None and now - last < DEDUP_WINDOW:
+            return True
+        _recent[key] = now
+        if len(_recent) > 1024:
+            cutoff = now - DEDUP_WINDOW
+            for stale in [k for k, seen in _recent.items() if seen < cutoff]:
+                del _recent[stale]
+    return False
+
+
+def put(entry):
+    """
+    Queue an unsaved QueryHistory row for the next flush
+    Repeats of a query within DEDUP_WINDOW (dashboard refreshes,
+    double submits) are dropped
+    """
+    start()
+    if _is_repeat(entry):
+        return
+    try:
+        _queue.put_nowait(entry)
+    except queue.Full:
+        logger.warning("Query history queue is full, dropping entry")
+
+
+def drain():
+    """Take every row currently queued"""
+    items = []
+    while True:
+        try:
+            item = _queue.get_nowait()
+        except queue.Empty:
+            return items
+        if item is not _STOP:
+            items.append(item)
+
+
+def flush():
+    """Insert all queued rows, returns the number written"""
+    items = drain()
+    if items:
+        QueryHistory.objects.bulk_create(items, batch_size=BATCH_SIZE)
+    return len(items)
+
+
+def _next_batch():
+    """
+    Block for the first row, then collect until the batch fills or the interval ends
+    Returns (rows, stopping), stopping is True once _STOP has been taken
+    """
+    first = _queue.get()
+    if first is _STOP:
+        return [], True
+    items = [first]
+    deadline = time.monotonic() + FLUSH_INTERVAL
+    while len(items) < BATCH_SIZE:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            item = _queue.get(timeout=timeout)
+        except queue.Empty:
+            break
+        if item is _STOP:
+            return items, True
+        items.append(item)
+    return items, False
+
+
+def _run():
+    stopping = False
+    while not stopping:
+        items, stopping = _next_batch()
+        if not items:
+            continue
+        # This thread never sees request_started/finished, so hand its
+        # connection back to the pool (or drop a broken one) the same way here
+        close_old_connections()
+        try:
+            QueryHistory.objects.bulk_create(items, batch_size=BATCH_SIZE)
+        except Exception as e:
+            logger.error(f"Error writing query history: {e}")
+
+
+def stop(timeout=5.0):
+    """
+    Write out every row at exit: the writer finishes the batch it holds,
+    then whatever it didn't get to is flushed here
+    """
+    worker = _worker
+    if worker is not None and worker.is_alive():
+        try:
+            _queue.put(_STOP, timeout=timeout)
+            worker.join(timeout)
+        except queue.Full:
+            pass
+    flush()
+
+
+def start():
+    """Start the writer thread on the first put, and again after a fork"""
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        with _worker_lock:
+            if _worker is None or not _worker.is_alive():
+                if _worker is None:
+                    atexit.register(stop)
+                _worker = threading.Thread(target=_run, name='query-history-writer', daemon=True)
+                _worker.start()
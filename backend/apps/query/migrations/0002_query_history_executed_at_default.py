@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-15 11:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='queryhistory',
+            name='executed_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
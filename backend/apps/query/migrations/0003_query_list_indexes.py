@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-15 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query', '0002_query_history_executed_at_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='queryhistory',
+            index=models.Index(condition=models.Q(('was_successful', False)), fields=['-executed_at'], name='qh_failed_executed_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedquery',
+            index=models.Index(fields=['-updated_at'], name='sq_updated_at_idx'),
+        ),
+    ]
@@ -32,6 +32,9 @@ class SavedQuery(models.Model):
     class Meta:
         db_table = 'saved_queries'
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['-updated_at'], name='sq_updated_at_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -40,7 +43,8 @@ class SavedQuery(models.Model):
 class QueryHistory(models.Model):
     """Query execution history"""
     query = models.TextField()
-    executed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Not auto_now_add - rows are written in bulk after the query ran
+    executed_at = models.DateTimeField(default=timezone.now, db_index=True)
     execution_time_ms = models.IntegerField(default=0)
     result_count = models.IntegerField(default=0)
     was_successful = models.BooleanField(default=True)
@@ -52,6 +56,16 @@ class QueryHistory(models.Model):
     class Meta:
         db_table = 'query_history'
         ordering = ['-executed_at']
+        # executed_at's own index already serves the default ordering.
+        # Failed runs are a small slice of history, so they get a partial
+        # index for drilling into errors
+        indexes = [
+            models.Index(
+                fields=['-executed_at'],
+                condition=models.Q(was_successful=False),
+                name='qh_failed_executed_at_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"Query at {self.executed_at}"
@@ -2,10 +2,20 @@
 Dark Knight Phantom SIEM - Phantom Query Language (PQL) Engine
 A custom query language for security event analysis
 """
+import copy
+import functools
 import re
+import sys
+import threading
 from datetime import datetime, timedelta
+import orjson
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
 from django.utils import timezone
-from django.db.models import Q, Count, Sum, Avg, Min, Max
+from django.utils.dateparse import parse_datetime
+from django.db.models import JSONField, Q, TextField, Value, Count, Sum, Avg, Min, Max
+from django.db.models.functions import Cast, Upper
+from django.db.models.lookups import Regex
 from apps.events.models import SecurityEvent
 
 
@@ -20,166 +30,152 @@ class PQLExecutionError(Exception):
 
 
 class PQLToken:
-    """Token types for PQL lexer"""
-    KEYWORD = 'KEYWORD'
-    IDENTIFIER = 'IDENTIFIER'
-    STRING = 'STRING'
-    NUMBER = 'NUMBER'
-    OPERATOR = 'OPERATOR'
-    COMPARISON = 'COMPARISON'
-    LOGICAL = 'LOGICAL'
-    PIPE = 'PIPE'
-    COMMA = 'COMMA'
-    LPAREN = 'LPAREN'
-    RPAREN = 'RPAREN'
-    EOF = 'EOF'
+    """Token types for PQL lexer, NAMES maps each type back to its name for messages"""
+    NAMES = (
+        'KEYWORD', 'IDENTIFIER', 'STRING', 'NUMBER', 'OPERATOR', 'COMPARISON',
+        'LOGICAL', 'PIPE', 'COMMA', 'LPAREN', 'RPAREN', 'EOF',
+    )
+    (KEYWORD, IDENTIFIER, STRING, NUMBER, OPERATOR, COMPARISON,
+     LOGICAL, PIPE, COMMA, LPAREN, RPAREN, EOF) = range(len(NAMES))
+
+
+# One alternation per token kind, scanned left to right by finditer.
+# Strings keep escapes verbatim and may be unterminated (run to the end),
+# numbers may carry a time unit, and any other character is skipped.
+_TOKEN_RE = re.compile(r"""
+    (?P<WS>\s+)
+  | "(?P<DSTRING>(?:\\[\s\S]|[^"\\])*\\?)"?
+  | '(?P<SSTRING>(?:\\[\s\S]|[^'\\])*\\?)'?
+  | (?P<NUMBER>-?\d[\d.]*[hmsdw]?)
+  | (?P<IDENT>[^\W\d]\w*)
+  | (?P<COMPARISON>[=!<>]+)
+  | (?P<PIPE>\|)
+  | (?P<COMMA>,)
+  | (?P<LPAREN>\()
+  | (?P<RPAREN>\))
+  | (?P<SKIP>[\s\S])
+""", re.VERBOSE)
+
+_GROUP_TOKENS = {
+    'DSTRING': PQLToken.STRING,
+    'SSTRING': PQLToken.STRING,
+    'NUMBER': PQLToken.NUMBER,
+    'COMPARISON': PQLToken.COMPARISON,
+    'PIPE': PQLToken.PIPE,
+    'COMMA': PQLToken.COMMA,
+    'LPAREN': PQLToken.LPAREN,
+    'RPAREN': PQLToken.RPAREN,
+}
 
 
 class PQLLexer:
     """Tokenizer for PQL"""
     
-    KEYWORDS = {
+    KEYWORDS = frozenset({
         'SEARCH', 'HUNT', 'AGGREGATE', 'TIMELINE', 'CORRELATE',
         'WHERE', 'AND', 'OR', 'NOT', 'IN', 'CONTAINS', 'LIKE',
         'ORDER', 'BY', 'ASC', 'DESC', 'LIMIT', 'OFFSET',
         'GROUP', 'HAVING', 'COUNT', 'SUM', 'AVG', 'MIN', 'MAX',
-        'DISTINCT', 'TOP', 'WITHIN', 'FROM', 'TO', 'AS',
+        'DISTINCT', 'TOP', 'WITHIN', 'FROM', 'TO', 'AS', 'FIELDS',
         'NOW', 'TRUE', 'FALSE', 'NULL'
-    }
+    })
+    _LOGICAL = frozenset({'AND', 'OR', 'NOT'})
     
     def __init__(self, query):
         self.query = query
-        self.pos = 0
-        self.tokens = []
+        # Token stream as parallel lists of types and values
+        self.types = []
+        self.values = []
     
     def tokenize(self):
-        """Tokenize the PQL query"""
-        while self.pos < len(self.query):
-            self._skip_whitespace()
-            if self.pos >= len(self.query):
-                break
-            
-            char = self.query[self.pos]
+        """Tokenize the PQL query, returns the (types, values) lists"""
+        add_type = self.types.append
+        add_value = self.values.append
+        logical = self._LOGICAL
+        keywords = self.KEYWORDS
+        
+        for match in _TOKEN_RE.finditer(self.query):
+            kind = match.lastgroup
+            if kind == 'WS' or kind == 'SKIP':
+                continue
             
-            # String literals
-            if char in '"\'':
-                self.tokens.append(self._read_string())
-            # Numbers
-            elif char.isdigit() or (char == '-' and self.pos + 1 < len(self.query) and self.query[self.pos + 1].isdigit()):
-                self.tokens.append(self._read_number())
-            # Identifiers and keywords
-            elif char.isalpha() or char == '_':
-                self.tokens.append(self._read_identifier())
-            # Operators
-            elif char in '=!<>':
-                self.tokens.append(self._read_comparison())
-            elif char == '|':
-                self.tokens.append((PQLToken.PIPE, '|'))
-                self.pos += 1
-            elif char == ',':
-                self.tokens.append((PQLToken.COMMA, ','))
-                self.pos += 1
-            elif char == '(':
-                self.tokens.append((PQLToken.LPAREN, '('))
-                self.pos += 1
-            elif char == ')':
-                self.tokens.append((PQLToken.RPAREN, ')'))
-                self.pos += 1
-            else:
-                self.pos += 1  # Skip unknown characters
-        
-        self.tokens.append((PQLToken.EOF, None))
-        return self.tokens
-    
-    def _skip_whitespace(self):
-        while self.pos < len(self.query) and self.query[self.pos].isspace():
-            self.pos += 1
-    
-    def _read_string(self):
-        quote_char = self.query[self.pos]
-        self.pos += 1
-        start = self.pos
-        
-        while self.pos < len(self.query) and self.query[self.pos] != quote_char:
-            if self.query[self.pos] == '\\':
-                self.pos += 2
+            value = match.group(kind)
+            if kind == 'IDENT':
+                upper_value = value.upper()
+                if upper_value in logical:
+                    add_type(PQLToken.LOGICAL)
+                    add_value(upper_value)
+                elif upper_value in keywords:
+                    add_type(PQLToken.KEYWORD)
+                    add_value(upper_value)
+                else:
+                    add_type(PQLToken.IDENTIFIER)
+                    add_value(value)
             else:
-                self.pos += 1
-        
-        value = self.query[start:self.pos]
-        self.pos += 1  # Skip closing quote
-        return (PQLToken.STRING, value)
-    
-    def _read_number(self):
-        start = self.pos
-        if self.query[self.pos] == '-':
-            self.pos += 1
-        
-        while self.pos < len(self.query) and (self.query[self.pos].isdigit() or self.query[self.pos] == '.'):
-            self.pos += 1
-        
-        # Check for time units (h, m, s, d, w)
-        if self.pos < len(self.query) and self.query[self.pos] in 'hmsdw':
-            self.pos += 1
-        
-        return (PQLToken.NUMBER, self.query[start:self.pos])
-    
-    def _read_identifier(self):
-        start = self.pos
-        while self.pos < len(self.query) and (self.query[self.pos].isalnum() or self.query[self.pos] == '_'):
-            self.pos += 1
+                add_type(_GROUP_TOKENS[kind])
+                add_value(value)
         
-        value = self.query[start:self.pos]
-        upper_value = value.upper()
-        
-        if upper_value in self.KEYWORDS:
-            if upper_value in ('AND', 'OR', 'NOT'):
-                return (PQLToken.LOGICAL, upper_value)
-            return (PQLToken.KEYWORD, upper_value)
-        
-        return (PQLToken.IDENTIFIER, value)
-    
-    def _read_comparison(self):
-        start = self.pos
-        while self.pos < len(self.query) and self.query[self.pos] in '=!<>':
-            self.pos += 1
-        return (PQLToken.COMPARISON, self.query[start:self.pos])
+        add_type(PQLToken.EOF)
+        add_value(None)
+        return self.types, self.values
+
+
+# Logical operator binding strength in WHERE clauses
+_PRECEDENCE = {'OR': 1, 'AND': 2, 'NOT': 3}
 
 
 class PQLParser:
     """Parser for PQL"""
     
-    def __init__(self, tokens):
-        self.tokens = tokens
+    def __init__(self, types, values):
+        self.types = types
+        self.values = values
         self.pos = 0
     
+    def current_type(self):
+        if self.pos < len(self.types):
+            return self.types[self.pos]
+        return PQLToken.EOF
+    
+    def current_value(self):
+        if self.pos < len(self.values):
+            return self.values[self.pos]
+        return None
+    
     def current_token(self):
-        if self.pos < len(self.tokens):
-            return self.tokens[self.pos]
-        return (PQLToken.EOF, None)
+        """Current token as a (type name, value) pair, for error messages"""
+        return (PQLToken.NAMES[self.current_type()], self.current_value())
     
     def consume(self, expected_type=None, expected_value=None):
-        token = self.current_token()
-        if expected_type and token[0] != expected_type:
-            raise PQLSyntaxError(f"Expected {expected_type}, got {token[0]}")
-        if expected_value and token[1] != expected_value:
-            raise PQLSyntaxError(f"Expected '{expected_value}', got '{token[1]}'")
+        """Consume the current token and return its value"""
+        token_type = self.current_type()
+        value = self.current_value()
+        if expected_type is not None and token_type != expected_type:
+            raise PQLSyntaxError(f"Expected {PQLToken.NAMES[expected_type]}, got {PQLToken.NAMES[token_type]}")
+        if expected_value and value != expected_value:
+            raise PQLSyntaxError(f"Expected '{expected_value}', got '{value}'")
         self.pos += 1
-        return token
+        return value
+    
+    def consume_field(self):
+        """
+        Consume a field name, lowercased and interned so the executor's
+        field map and model lookups need no case handling
+        """
+        return sys.intern(self.consume(PQLToken.IDENTIFIER).lower())
     
     def parse(self):
         """Parse the tokens into an AST"""
-        token = self.current_token()
-        
-        if token[0] == PQLToken.KEYWORD:
-            if token[1] == 'SEARCH':
+        if self.current_type() == PQLToken.KEYWORD:
+            value = self.current_value()
+            if value == 'SEARCH':
                 return self.parse_search()
-            elif token[1] == 'HUNT':
+            elif value == 'HUNT':
                 return self.parse_hunt()
-            elif token[1] == 'AGGREGATE':
+            elif value == 'AGGREGATE':
                 return self.parse_aggregate()
         
-        raise PQLSyntaxError(f"Unexpected token: {token}")
+        raise PQLSyntaxError(f"Unexpected token: {self.current_token()}")
     
     def parse_search(self):
         """Parse SEARCH command"""
@@ -187,12 +183,13 @@ class PQLParser:
         
         # Parse source (optional)
         source = 'events'
-        if self.current_token()[0] == PQLToken.IDENTIFIER:
-            source = self.consume(PQLToken.IDENTIFIER)[1]
+        if self.current_type() == PQLToken.IDENTIFIER:
+            source = self.consume(PQLToken.IDENTIFIER)
         
         result = {
             'command': 'SEARCH',
             'source': source,
+            'fields': None,
             'conditions': [],
             'order_by': None,
             'order_dir': 'DESC',
@@ -200,24 +197,29 @@ class PQLParser:
             'offset': 0,
         }
         
+        # Parse FIELDS projection
+        if self.current_value() == 'FIELDS':
+            self.consume(PQLToken.KEYWORD, 'FIELDS')
+            result['fields'] = self.parse_field_list()
+        
         # Parse WHERE clause
-        if self.current_token()[1] == 'WHERE':
+        if self.current_value() == 'WHERE':
             self.consume(PQLToken.KEYWORD, 'WHERE')
             result['conditions'] = self.parse_conditions()
         
         # Parse ORDER BY
-        if self.current_token()[1] == 'ORDER':
+        if self.current_value() == 'ORDER':
             self.consume(PQLToken.KEYWORD, 'ORDER')
             self.consume(PQLToken.KEYWORD, 'BY')
-            result['order_by'] = self.consume(PQLToken.IDENTIFIER)[1]
+            result['order_by'] = self.consume_field()
             
-            if self.current_token()[1] in ('ASC', 'DESC'):
-                result['order_dir'] = self.consume(PQLToken.KEYWORD)[1]
+            if self.current_value() in ('ASC', 'DESC'):
+                result['order_dir'] = self.consume(PQLToken.KEYWORD)
         
         # Parse LIMIT
-        if self.current_token()[1] == 'LIMIT':
+        if self.current_value() == 'LIMIT':
             self.consume(PQLToken.KEYWORD, 'LIMIT')
-            result['limit'] = int(self.consume(PQLToken.NUMBER)[1])
+            result['limit'] = int(self.consume(PQLToken.NUMBER))
         
         return result
     
@@ -226,8 +228,8 @@ class PQLParser:
         self.consume(PQLToken.KEYWORD, 'HUNT')
         
         target = 'events'
-        if self.current_token()[0] == PQLToken.IDENTIFIER:
-            target = self.consume(PQLToken.IDENTIFIER)[1]
+        if self.current_type() == PQLToken.IDENTIFIER:
+            target = self.consume(PQLToken.IDENTIFIER)
         
         result = {
             'command': 'HUNT',
@@ -237,18 +239,18 @@ class PQLParser:
             'limit': 500,
         }
         
-        if self.current_token()[1] == 'WHERE':
+        if self.current_value() == 'WHERE':
             self.consume(PQLToken.KEYWORD, 'WHERE')
             result['conditions'] = self.parse_conditions()
         
-        if self.current_token()[1] == 'GROUP':
+        if self.current_value() == 'GROUP':
             self.consume(PQLToken.KEYWORD, 'GROUP')
             self.consume(PQLToken.KEYWORD, 'BY')
-            result['group_by'] = self.consume(PQLToken.IDENTIFIER)[1]
+            result['group_by'] = self.consume_field()
         
-        if self.current_token()[1] == 'LIMIT':
+        if self.current_value() == 'LIMIT':
             self.consume(PQLToken.KEYWORD, 'LIMIT')
-            result['limit'] = int(self.consume(PQLToken.NUMBER)[1])
+            result['limit'] = int(self.consume(PQLToken.NUMBER))
         
         return result
     
@@ -257,8 +259,8 @@ class PQLParser:
         self.consume(PQLToken.KEYWORD, 'AGGREGATE')
         
         source = 'events'
-        if self.current_token()[0] == PQLToken.IDENTIFIER:
-            source = self.consume(PQLToken.IDENTIFIER)[1]
+        if self.current_type() == PQLToken.IDENTIFIER:
+            source = self.consume(PQLToken.IDENTIFIER)
         
         result = {
             'command': 'AGGREGATE',
@@ -270,206 +272,445 @@ class PQLParser:
             'within': None,
         }
         
-        if self.current_token()[1] == 'BY':
+        if self.current_value() == 'BY':
             self.consume(PQLToken.KEYWORD, 'BY')
-            result['group_by'] = self.consume(PQLToken.IDENTIFIER)[1]
+            result['group_by'] = self.consume_field()
         
         # Parse aggregation function
-        if self.current_token()[1] in ('COUNT', 'SUM', 'AVG', 'MIN', 'MAX'):
-            func = self.consume(PQLToken.KEYWORD)[1]
+        if self.current_value() in ('COUNT', 'SUM', 'AVG', 'MIN', 'MAX'):
+            func = self.consume(PQLToken.KEYWORD)
             result['aggregations'].append({'function': func})
         
-        if self.current_token()[1] == 'WHERE':
+        if self.current_value() == 'WHERE':
             self.consume(PQLToken.KEYWORD, 'WHERE')
             result['conditions'] = self.parse_conditions()
         
-        if self.current_token()[1] == 'WITHIN':
+        if self.current_value() == 'WITHIN':
             self.consume(PQLToken.KEYWORD, 'WITHIN')
             # Parse time value (e.g., "1h", "24h", "7d") using _parse_value which handles time parsing
             result['within'] = self._parse_value()
         
         return result
     
+    def parse_field_list(self):
+        """Parse a comma separated list of field names"""
+        fields = [self.consume_field()]
+        while self.current_type() == PQLToken.COMMA:
+            self.consume(PQLToken.COMMA)
+            fields.append(self.consume_field())
+        return fields
+    
     def parse_conditions(self):
-        """Parse WHERE conditions"""
-        conditions = []
+        """
+        Parse WHERE conditions into postfix order: condition dicts and
+        'AND' / 'OR' / 'NOT' operator strings, e.g. a OR b AND c -> [a, b, c, 'AND', 'OR']
+        NOT binds tightest, then AND, then OR; parentheses group
+        """
+        output = []
+        pending = []  # operators and '(' not yet emitted
         
         while True:
-            condition = self.parse_condition()
-            conditions.append(condition)
+            # Operand: any prefix NOTs and open parens, then a condition
+            while True:
+                if self.current_type() == PQLToken.LOGICAL and self.current_value() == 'NOT':
+                    pending.append(self.consume(PQLToken.LOGICAL))
+                elif self.current_type() == PQLToken.LPAREN:
+                    self.consume(PQLToken.LPAREN)
+                    pending.append('(')
+                else:
+                    break
+            output.append(self.parse_condition())
             
-            if self.current_token()[0] == PQLToken.LOGICAL:
-                logical_op = self.consume(PQLToken.LOGICAL)[1]
-                conditions.append({'logical': logical_op})
-            else:
+            # Close any groups that end here
+            while self.current_type() == PQLToken.RPAREN and '(' in pending:
+                self.consume(PQLToken.RPAREN)
+                while pending[-1] != '(':
+                    output.append(pending.pop())
+                pending.pop()
+            
+            if self.current_type() != PQLToken.LOGICAL:
                 break
-        
-        return conditions
+            
+            op = self.consume(PQLToken.LOGICAL)
+            negate = op == 'NOT'
+            if negate:
+                # "a NOT b" reads as "a AND NOT b"
+                op = 'AND'
+            precedence = _PRECEDENCE[op]
+            while pending and pending[-1] != '(' and _PRECEDENCE[pending[-1]] >= precedence:
+                output.append(pending.pop())
+            pending.append(op)
+            if negate:
+                pending.append('NOT')
+        
+        while pending:
+            op = pending.pop()
+            if op == '(':
+                raise PQLSyntaxError(f"Expected RPAREN, got {PQLToken.NAMES[self.current_type()]}")
+            output.append(op)
+        
+        return output
     
     def parse_condition(self):
         """Parse a single condition"""
-        field = self.consume(PQLToken.IDENTIFIER)[1]
+        field = self.consume_field()
         
-        token = self.current_token()
+        token_type = self.current_type()
+        token_value = self.current_value()
         
-        if token[0] == PQLToken.COMPARISON:
-            operator = self.consume(PQLToken.COMPARISON)[1]
+        if token_type == PQLToken.COMPARISON:
+            operator = self.consume(PQLToken.COMPARISON)
             value = self._parse_value()
             return {'field': field, 'operator': operator, 'value': value}
         
-        elif token[1] == 'CONTAINS':
+        elif token_value == 'CONTAINS':
             self.consume(PQLToken.KEYWORD, 'CONTAINS')
             value = self._parse_value()
             return {'field': field, 'operator': 'CONTAINS', 'value': value}
         
-        elif token[1] == 'LIKE':
+        elif token_value == 'LIKE':
             self.consume(PQLToken.KEYWORD, 'LIKE')
             value = self._parse_value()
             return {'field': field, 'operator': 'LIKE', 'value': value}
         
-        elif token[1] == 'IN':
+        elif token_value == 'IN':
             self.consume(PQLToken.KEYWORD, 'IN')
             self.consume(PQLToken.LPAREN)
             values = []
-            while self.current_token()[0] != PQLToken.RPAREN:
+            while self.current_type() != PQLToken.RPAREN:
                 values.append(self._parse_value())
-                if self.current_token()[0] == PQLToken.COMMA:
+                if self.current_type() == PQLToken.COMMA:
                     self.consume(PQLToken.COMMA)
             self.consume(PQLToken.RPAREN)
             return {'field': field, 'operator': 'IN', 'value': values}
         
-        raise PQLSyntaxError(f"Expected operator, got {token}")
+        raise PQLSyntaxError(f"Expected operator, got {self.current_token()}")
     
     def _parse_value(self):
         """Parse a value (string, number, or time expression)"""
-        token = self.current_token()
-        
-        if token[0] == PQLToken.STRING:
-            return self.consume(PQLToken.STRING)[1]
-        elif token[0] == PQLToken.NUMBER:
-            value = self.consume(PQLToken.NUMBER)[1]
-            # Parse time expression (e.g., "24h", "7d", "1h")
-            if len(value) > 0 and value[-1].lower() in 'hmsdw':
-                return self._parse_time_value(value)
+        token_type = self.current_type()
+        token_value = self.current_value()
+        
+        if token_type == PQLToken.STRING:
+            return self.consume(PQLToken.STRING)
+        elif token_type == PQLToken.NUMBER:
+            value = self.consume(PQLToken.NUMBER)
+            # Time expression (e.g., "24h", "7d", "1h"), resolved when executed
+            # The lexer only emits non-empty NUMBER tokens with a lowercase unit
+            if value[-1] in _UNIT_SET:
+                return PQLTimeExpr(value)
             # Regular number
             try:
                 return int(value) if '.' not in value else float(value)
             except ValueError:
                 raise PQLSyntaxError(f"Invalid number: {value}")
-        elif token[0] == PQLToken.IDENTIFIER:
+        elif token_type == PQLToken.IDENTIFIER:
             # Treat identifiers as string values (e.g., CRITICAL, HIGH, etc.)
-            return self.consume(PQLToken.IDENTIFIER)[1]
-        elif token[1] == 'NOW':
+            return self.consume(PQLToken.IDENTIFIER)
+        elif token_value == 'NOW':
             self.consume(PQLToken.KEYWORD, 'NOW')
-            return timezone.now()
-        elif token[1] in ('TRUE', 'FALSE'):
-            return self.consume(PQLToken.KEYWORD)[1] == 'TRUE'
-        elif token[1] == 'NULL':
+            return PQLTimeExpr('NOW')
+        elif token_value in ('TRUE', 'FALSE'):
+            return self.consume(PQLToken.KEYWORD) == 'TRUE'
+        elif token_value == 'NULL':
             self.consume(PQLToken.KEYWORD)
             return None
         
-        raise PQLSyntaxError(f"Expected value, got {token}")
-    
-    def _parse_time_value(self, value):
-        """Parse time value like '24h' or '7d' - returns timezone-aware datetime"""
-        return parse_time_value(value)
+        raise PQLSyntaxError(f"Expected value, got {self.current_token()}")
 
 
-def parse_time_value(value):
-    """Standalone function to parse time value like '24h' or '7d' - returns timezone-aware datetime"""
+# Seconds per relative time unit
+_UNIT_TO_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+_UNIT_SET = frozenset(_UNIT_TO_SECONDS)
+
+
+@functools.lru_cache(maxsize=64)
+def _time_delta(value):
+    """Offset for a time value like '24h' or '7d', None if it isn't one"""
     if not value or len(value) < 2:
-        return timezone.now()
+        return None
     
-    unit = value[-1].lower()
+    seconds = _UNIT_TO_SECONDS.get(value[-1].lower())
     try:
         amount = int(value[:-1])
     except (ValueError, TypeError):
-        return timezone.now()
+        return None
     
-    # Get current timezone-aware datetime
+    if seconds is None:
+        return None
+    return timedelta(seconds=amount * seconds)
+
+
+def parse_time_value(value):
+    """Standalone function to parse time value like '24h' or '7d' - returns timezone-aware datetime"""
+    # Only the parsed offset is cached, it is always applied to the current time
     now = timezone.now()
-    
-    # Calculate the time difference
-    if unit == 's':
-        delta = timedelta(seconds=amount)
-    elif unit == 'm':
-        delta = timedelta(minutes=amount)
-    elif unit == 'h':
-        delta = timedelta(hours=amount)
-    elif unit == 'd':
-        delta = timedelta(days=amount)
-    elif unit == 'w':
-        delta = timedelta(weeks=amount)
-    else:
+    delta = _time_delta(value)
+    if delta is None:
         return now
+    return now - delta
+
+
+def _coerce_timestamp(value):
+    """
+    Convert a timestamp condition value to a timezone-aware datetime
+    Django ORM requires timezone-aware datetimes for DateTimeField comparisons
+    """
+    if isinstance(value, datetime):
+        return timezone.make_aware(value) if timezone.is_naive(value) else value
+    
+    if isinstance(value, str):
+        # Check if it's a time expression (e.g., "1h", "24h", "7d")
+        if len(value) > 0 and value[-1].lower() in _UNIT_SET:
+            return parse_time_value(value)
+        # Try to parse as ISO datetime string
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            return value
+        if parsed:
+            return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+    
+    return value
+
+
+class PQLTimeExpr(str):
+    """
+    Relative time literal ('24h', 'NOW') kept unresolved in the AST
+    so a parsed query can be reused, resolved against the clock on execution
+    """
+    __slots__ = ()
     
-    result = now - delta
-    
-    # Ensure timezone-aware (should already be, but double-check)
-    if timezone.is_naive(result):
-        result = timezone.make_aware(result)
-    
-    return result
+    def resolve(self):
+        if self == 'NOW':
+            return timezone.now()
+        return parse_time_value(self)
+
+
+def _resolve_times(ast):
+    """Replace the time literals in an AST with datetimes, in place"""
+    for condition in ast.get('conditions', ()):
+        if not isinstance(condition, dict):
+            continue
+        value = condition.get('value')
+        if isinstance(value, PQLTimeExpr):
+            condition['value'] = value.resolve()
+        elif isinstance(value, list):
+            condition['value'] = [v.resolve() if isinstance(v, PQLTimeExpr) else v for v in value]
+    
+    within = ast.get('within')
+    if isinstance(within, PQLTimeExpr):
+        ast['within'] = within.resolve()
+
+
+# PQL field names and aliases to SecurityEvent fields
+_FIELD_MAP = {
+    'event_id': 'event_id',
+    'timestamp': 'timestamp',
+    'hostname': 'hostname',
+    'channel': 'channel',
+    'severity': 'severity',
+    'user_name': 'user_name',
+    'user': 'user_name',
+    'source_ip': 'source_ip',
+    'dest_ip': 'destination_ip',
+    'destination_ip': 'destination_ip',
+    'process_name': 'process_name',
+    'process': 'process_name',
+    'process_path': 'process_path',
+    'command_line': 'command_line',
+    'cmd': 'command_line',
+    'service_name': 'service_name',
+    'service': 'service_name',
+    'message': 'message',
+    'msg': 'message',
+    'agent_id': 'agent_id',
+    'logon_type': 'logon_type',
+    'raw_xml': 'raw_xml',
+    'xml': 'raw_xml',
+    'event_data': 'event_data',
+    'data': 'event_data',
+    'full_text': 'full_text',
+    'text': 'full_text',
+}
+
+
+@functools.cache
+def _valid_fields():
+    """Valid SecurityEvent field names, built once after apps are loaded"""
+    fields = {field.name for field in SecurityEvent._meta.get_fields() if hasattr(field, 'name')}
+    # Also include mapped fields
+    fields.update(_FIELD_MAP.values())
+    return frozenset(fields)
+
+
+@functools.cache
+def _selectable_fields():
+    """
+    FIELDS names that map to SecurityEvent columns, foreign keys are
+    selected by their id column so the value matches the key it's under
+    """
+    columns = {}
+    for field in SecurityEvent._meta.concrete_fields:
+        columns[field.name] = field.attname
+        columns[field.attname] = field.attname
+    return columns
+
+
+# Large text/JSON columns are only returned when named in a FIELDS clause,
+# the query page shows them from the event detail view instead
+_HEAVY_FIELDS = frozenset({'raw_xml', 'full_text', 'event_data'})
+
+
+@functools.cache
+def _default_fields():
+    """Columns returned for event rows when no FIELDS clause is given"""
+    return tuple(
+        field.attname for field in SecurityEvent._meta.concrete_fields
+        if field.name not in _HEAVY_FIELDS
+    )
+
+
+@functools.cache
+def _json_columns():
+    """SecurityEvent JSON columns, which Django's psycopg 3 setup loads as text on raw cursors"""
+    return frozenset(
+        field.column for field in SecurityEvent._meta.concrete_fields
+        if isinstance(field, JSONField)
+    )
+
+
+def _iter_rows(queryset, chunk_size=500):
+    """
+    Yield the rows of a values() queryset as dicts read straight off the
+    cursor, skipping Django's per-row value converters
+    Results that fit in one fetch use a regular cursor, which psycopg
+    prepares once a query shape repeats (prepare_threshold in settings),
+    larger ones stream from a server-side cursor
+    """
+    query = queryset.query
+    try:
+        sql, params = query.get_compiler(queryset.db).as_sql()
+    except EmptyResultSet:
+        return
+    
+    loads = orjson.loads
+    connection = connections[queryset.db]
+    single_fetch = query.high_mark is not None and query.high_mark - query.low_mark <= chunk_size
+    cursor = connection.cursor() if single_fetch else connection.chunked_cursor()
+    
+    with cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchmany(chunk_size)
+        # Read after the first fetch so server-side cursors have described their columns
+        names = [column[0] for column in cursor.description or ()]
+        json_names = [name for name in names if name in _json_columns()]
+        
+        while rows:
+            for row in rows:
+                row = dict(zip(names, row))
+                for name in json_names:
+                    if row[name] is not None:
+                        row[name] = loads(row[name])
+                yield row
+            rows = cursor.fetchmany(chunk_size)
+
+
+def _contains_q(field, value):
+    # Searches the named column only, message CONTAINS can use its trigram index
+    return Q(**{f'{field}__icontains': value})
+
+
+@functools.lru_cache(maxsize=256)
+def _like_lookup(value):
+    """
+    Translate a case-insensitive SQL LIKE pattern to a (lookup, operand) pair
+    Plain prefix/suffix/substring patterns map to Django's i* lookups, which
+    compile to UPPER(col) LIKE UPPER(...) and can use the trigram indexes
+    """
+    pattern = str(value)
+    core = pattern.strip('%')
+    if '%' not in core and '_' not in core:
+        starts, ends = pattern.startswith('%'), pattern.endswith('%')
+        if starts and ends:
+            return 'icontains', core
+        if ends:
+            return 'istartswith', core
+        if starts:
+            return 'iendswith', core
+        return 'iexact', core
+    
+    # Anything else becomes an anchored regex, escaping everything but the wildcards
+    regex = re.escape(pattern).replace('%', '.*').replace('_', '.')
+    return 'regex', f'^{regex}$'
+
+
+def _like_q(field, value):
+    lookup, operand = _like_lookup(value)
+    if lookup == 'regex':
+        # Match on the same UPPER(col::text) expression the trigram indexes cover
+        return Q(Regex(Upper(Cast(field, TextField())), Upper(Value(operand))))
+    return Q(**{f'{field}__{lookup}': operand})
+
+
+# Matches no rows, Django skips the query entirely
+_NEVER = Q(pk__in=[])
+
+
+def _narrow(allowed, field, operator, value):
+    """
+    Record an = or IN term of an AND-only chain in allowed (field -> set of values)
+    Returns False once the field can no longer match any value
+    """
+    if operator == '=':
+        values = {value}
+    elif operator == 'IN':
+        values = set(value)
+    else:
+        return True
+    
+    # Values of different types may still be equal once the database
+    # casts them (4625 and "4625"), only compare like with like
+    kinds = {type(v) for v in values}
+    if len(kinds) != 1:
+        return True
+    
+    previous = allowed.get(field)
+    if previous is None:
+        allowed[field] = values
+        return True
+    if {type(v) for v in previous} != kinds:
+        return True
+    
+    previous &= values
+    return bool(previous)
+
+
+# Condition operator -> Q object builder taking (field, value)
+_OP_BUILDERS = {
+    '=': lambda field, value: Q(**{field: value}),
+    '!=': lambda field, value: ~Q(**{field: value}),
+    '>': lambda field, value: Q(**{f'{field}__gt': value}),
+    '>=': lambda field, value: Q(**{f'{field}__gte': value}),
+    '<': lambda field, value: Q(**{f'{field}__lt': value}),
+    '<=': lambda field, value: Q(**{f'{field}__lte': value}),
+    'CONTAINS': _contains_q,
+    'LIKE': _like_q,
+    'IN': lambda field, value: Q(**{f'{field}__in': value}),
+}
 
 
 class PQLExecutor:
     """Executes parsed PQL queries"""
     
-    FIELD_MAP = {
-        'event_id': 'event_id',
-        'timestamp': 'timestamp',
-        'hostname': 'hostname',
-        'channel': 'channel',
-        'severity': 'severity',
-        'user_name': 'user_name',
-        'user': 'user_name',
-        'source_ip': 'source_ip',
-        'dest_ip': 'destination_ip',
-        'destination_ip': 'destination_ip',
-        'process_name': 'process_name',
-        'process': 'process_name',
-        'process_path': 'process_path',
-        'command_line': 'command_line',
-        'cmd': 'command_line',
-        'service_name': 'service_name',
-        'service': 'service_name',
-        'message': 'message',
-        'msg': 'message',
-        'agent_id': 'agent_id',
-        'logon_type': 'logon_type',
-        'raw_xml': 'raw_xml',
-        'xml': 'raw_xml',
-        'event_data': 'event_data',
-        'data': 'event_data',
-        'full_text': 'full_text',
-        'text': 'full_text',
-    }
-    
-    # Cache valid fields from SecurityEvent model
-    _valid_fields = None
+    FIELD_MAP = _FIELD_MAP
     
     def __init__(self):
         pass
     
-    def _get_valid_fields(self):
-        """Get list of valid field names from SecurityEvent model"""
-        if self._valid_fields is None:
-            # Get all field names from SecurityEvent model
-            self._valid_fields = set()
-            for field in SecurityEvent._meta.get_fields():
-                if hasattr(field, 'name'):
-                    self._valid_fields.add(field.name)
-            # Also include mapped fields
-            self._valid_fields.update(self.FIELD_MAP.values())
-        return self._valid_fields
-    
-    def _is_valid_field(self, field_name):
-        """Check if a field name is valid for SecurityEvent model"""
-        valid_fields = self._get_valid_fields()
-        return field_name in valid_fields
-    
     def execute(self, ast):
         """Execute a parsed PQL AST"""
+        _resolve_times(ast)
         command = ast.get('command')
         
         if command == 'SEARCH':
@@ -503,7 +744,7 @@ class PQLExecutor:
         
         # Apply ordering
         order_by = ast.get('order_by') or 'timestamp'
-        order_by = self.FIELD_MAP.get(order_by, order_by) or 'timestamp'
+        order_by = _FIELD_MAP.get(order_by, order_by) or 'timestamp'
         if ast.get('order_dir') == 'DESC':
             order_by = f'-{order_by}'
         queryset = queryset.order_by(order_by)
@@ -513,7 +754,8 @@ class PQLExecutor:
         offset = ast.get('offset', 0)
         queryset = queryset[offset:offset + limit]
         
-        return list(queryset.values())
+        fields = self._select_fields(ast.get('fields'))
+        return _iter_rows(queryset.values(*fields))
     
     def _execute_hunt(self, ast):
         """Execute HUNT command (threat hunting)"""
@@ -536,15 +778,17 @@ class PQLExecutor:
         
         group_by = ast.get('group_by')
         if group_by:
-            group_by = self.FIELD_MAP.get(group_by, group_by)
+            group_by = _FIELD_MAP.get(group_by, group_by)
             queryset = queryset.values(group_by).annotate(
                 count=Count('id'),
                 first_seen=Min('timestamp'),
                 last_seen=Max('timestamp')
             ).order_by('-count')
+        else:
+            queryset = queryset.values(*_default_fields())
         
         limit = ast.get('limit', 500)
-        return list(queryset[:limit])
+        return _iter_rows(queryset[:limit])
     
     def _execute_aggregate(self, ast):
         """Execute AGGREGATE command"""
@@ -562,8 +806,11 @@ class PQLExecutor:
                     within = timezone.make_aware(within)
                 queryset = queryset.filter(timestamp__gte=within)
         
-        q_objects = self._build_q_objects(ast.get('conditions', []))
-        if q_objects:
+        q_objects, has_valid = self._build_q_objects(ast.get('conditions', []))
+        if not has_valid:
+            # All conditions were invalid fields - return empty result
+            queryset = SecurityEvent.objects.none()
+        elif q_objects:
             try:
                 queryset = queryset.filter(q_objects)
             except Exception as e:
@@ -574,53 +821,98 @@ class PQLExecutor:
                 else:
                     raise
         
-        group_by = ast.get('group_by')
-        if group_by:
-            group_by = self.FIELD_MAP.get(group_by, group_by)
-            
-            aggregations = ast.get('aggregations', [{'function': 'COUNT'}])
-            agg_kwargs = {}
-            
-            for agg in aggregations:
-                func = agg['function']
-                if func == 'COUNT':
-                    agg_kwargs['count'] = Count('id')
-                elif func == 'SUM':
-                    agg_kwargs['sum'] = Sum('id')
-                elif func == 'AVG':
-                    agg_kwargs['avg'] = Avg('id')
-                elif func == 'MIN':
-                    agg_kwargs['min'] = Min('timestamp')
-                elif func == 'MAX':
-                    agg_kwargs['max'] = Max('timestamp')
-            
-            queryset = queryset.values(group_by).annotate(**agg_kwargs).order_by('-count')
+        # COUNT when no aggregation function is given
+        aggregations = ast.get('aggregations') or [{'function': 'COUNT'}]
+        agg_kwargs = {}
+        
+        for agg in aggregations:
+            func = agg['function']
+            if func == 'COUNT':
+                agg_kwargs['count'] = Count('id')
+            elif func == 'SUM':
+                agg_kwargs['sum'] = Sum('id')
+            elif func == 'AVG':
+                agg_kwargs['avg'] = Avg('id')
+            elif func == 'MIN':
+                agg_kwargs['min'] = Min('timestamp')
+            elif func == 'MAX':
+                agg_kwargs['max'] = Max('timestamp')
         
-        return list(queryset[:100])
+        group_by = ast.get('group_by')
+        if not group_by:
+            # Without BY the aggregation is a single row over all matching events
+            return iter([queryset.aggregate(**agg_kwargs)])
+        
+        group_by = _FIELD_MAP.get(group_by, group_by)
+        # Groups are ranked by the first aggregation
+        order_alias = next(iter(agg_kwargs))
+        queryset = queryset.values(group_by).annotate(**agg_kwargs).order_by(f'-{order_alias}')
+        
+        return queryset[:100].iterator(chunk_size=500)
+    
+    def _select_fields(self, requested):
+        """Resolve a FIELDS projection to model columns, always keeping id"""
+        if not requested:
+            return _default_fields()
+        
+        columns = _selectable_fields()
+        fields = ['id']
+        for name in requested:
+            field = columns.get(_FIELD_MAP.get(name, name))
+            if field is None:
+                raise PQLSyntaxError(f"Unknown field: {name}")
+            if field not in fields:
+                fields.append(field)
+        return fields
     
     def _build_q_objects(self, conditions):
         """Build Django Q objects from parsed conditions
+        Conditions are in postfix order and evaluated with a stack,
+        terms on invalid fields are None and drop out when combined
         Returns (q_object, has_valid_conditions) tuple
         If has_valid_conditions is False, all conditions were invalid
         """
         if not conditions:
             return None, True
         
-        q_result = None
-        current_logical = 'AND'
+        stack = []
+        push = stack.append
+        pop = stack.pop
         has_valid_conditions = False
+        valid_fields = _valid_fields()
+        map_field = _FIELD_MAP.get
+        op_builders = _OP_BUILDERS
+        
+        # In a chain joined only by AND, conflicting = / IN terms on the
+        # same field (severity = HIGH AND severity = LOW) can never match
+        all_and = 'OR' not in conditions and 'NOT' not in conditions
+        allowed = {}
         
         for item in conditions:
-            if 'logical' in item:
-                current_logical = item['logical']
+            if item.__class__ is str:
+                if item == 'NOT':
+                    q = pop()
+                    push(None if q is None else ~q)
+                    continue
+                right = pop()
+                left = pop()
+                if left is None:
+                    push(right)
+                elif right is None:
+                    push(left)
+                elif item == 'AND':
+                    push(left & right)
+                else:
+                    push(left | right)
                 continue
             
             field = item['field']
-            field = self.FIELD_MAP.get(field, field)
+            field = map_field(field, field)
             
             # Validate field exists in model
-            if not self._is_valid_field(field):
+            if field not in valid_fields:
                 # Skip invalid fields
+                push(None)
                 continue
             
             has_valid_conditions = True
@@ -629,91 +921,61 @@ class PQLExecutor:
             value = item['value']
             
             # Ensure datetime values are timezone-aware for timestamp fields
-            # Django ORM requires timezone-aware datetimes for DateTimeField comparisons
             if field == 'timestamp':
-                if isinstance(value, datetime):
-                    if timezone.is_naive(value):
-                        value = timezone.make_aware(value)
-                elif isinstance(value, str):
-                    # Check if it's a time expression (e.g., "1h", "24h", "7d")
-                    if len(value) > 0 and value[-1].lower() in 'hmsdw':
-                        value = parse_time_value(value)
-                    else:
-                        # Try to parse as ISO datetime string
-                        try:
-                            from django.utils.dateparse import parse_datetime
-                            parsed = parse_datetime(value)
-                            if parsed:
-                                value = parsed
-                                if timezone.is_naive(value):
-                                    value = timezone.make_aware(value)
-                        except:
-                            pass
+                value = _coerce_timestamp(value)
             
-            if operator == '=':
-                q = Q(**{field: value})
-            elif operator == '!=':
-                q = ~Q(**{field: value})
-            elif operator == '>':
-                q = Q(**{f'{field}__gt': value})
-            elif operator == '>=':
-                q = Q(**{f'{field}__gte': value})
-            elif operator == '<':
-                q = Q(**{f'{field}__lt': value})
-            elif operator == '<=':
-                q = Q(**{f'{field}__lte': value})
-            elif operator == 'CONTAINS':
-                # For message field, search across multiple text fields for comprehensive results
-                if field in ['message', 'msg']:
-                    # Search in message, raw_xml, event_data, and full_text fields
-                    q = (Q(message__icontains=value) | 
-                         Q(raw_xml__icontains=value) | 
-                         Q(event_data__icontains=value) |
-                         Q(full_text__icontains=value))
-                # For JSON fields, search within the JSON structure
-                elif field in ['event_data', 'user_data', 'system_data']:
-                    # Search in JSON field values
-                    q = Q(**{f'{field}__icontains': value})
-                else:
-                    q = Q(**{f'{field}__icontains': value})
-            elif operator == 'LIKE':
-                # Convert SQL LIKE to Django regex
-                pattern = value.replace('%', '.*').replace('_', '.')
-                q = Q(**{f'{field}__regex': pattern})
-            elif operator == 'IN':
-                q = Q(**{f'{field}__in': value})
-            else:
+            build = op_builders.get(operator)
+            if build is None:
+                push(None)
                 continue
             
-            if q_result is None:
-                q_result = q
-            elif current_logical == 'AND':
-                q_result &= q
-            elif current_logical == 'OR':
-                q_result |= q
+            if all_and and not _narrow(allowed, field, operator, value):
+                return _NEVER, True
+            push(build(field, value))
         
-        return q_result, has_valid_conditions
+        return stack[-1], has_valid_conditions
 
 
-def execute_pql(query_string, limit=100):
-    """
-    Main function to execute a PQL query
-    Returns the query results
+# Set on a cache miss, so compile_pql can tell which thread did the parsing
+_compile_state = threading.local()
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_ast(query_string):
+    """Tokenize and parse a query string, cached per distinct query"""
+    _compile_state.miss = True
+    lexer = PQLLexer(query_string)
+    types, values = lexer.tokenize()
     
-    Args:
-        query_string: PQL query string
-        limit: Maximum number of results (default 100, max 5000)
+    parser = PQLParser(types, values)
+    return parser.parse()
+
+
+def compile_pql(query_string):
+    """
+    Compile a PQL query string into a plan for run_plan
+    Returns (plan, cached), cached is False when this call did the parsing
+    The plan is shared between callers and must not be modified
     """
     if not query_string or not query_string.strip():
         raise PQLSyntaxError("Empty query string")
     
-    # Tokenize
-    lexer = PQLLexer(query_string)
-    tokens = lexer.tokenize()
+    _compile_state.miss = False
+    plan = _compile_ast(query_string.strip())
+    return plan, not _compile_state.miss
+
+
+def run_plan(plan, limit=100):
+    """
+    Execute a compiled plan, returning an iterator over the result rows
+    Rows are fetched from the database in chunks as the iterator is consumed
     
-    # Parse
-    parser = PQLParser(tokens)
-    ast = parser.parse()
+    Args:
+        plan: Plan from compile_pql
+        limit: Maximum number of results (default 100, max 5000)
+    """
+    # Copied since the cached plan is shared
+    ast = copy.deepcopy(plan)
     
     # Override limit if provided and valid
     if limit and isinstance(limit, int) and 1 <= limit <= 5000:
@@ -722,7 +984,39 @@ def execute_pql(query_string, limit=100):
     
     # Execute
     executor = PQLExecutor()
-    results = executor.execute(ast)
+    return executor.execute(ast)
+
+
+def stream_pql(query_string, limit=100):
+    """
+    Execute a PQL query, returning an iterator over the result rows
+    
+    Args:
+        query_string: PQL query string
+        limit: Maximum number of results (default 100, max 5000)
+    """
+    plan, _ = compile_pql(query_string)
+    return run_plan(plan, limit=limit)
+
+
+class QueryResult:
+    """Fully fetched PQL results"""
+    __slots__ = ('rows', 'count')
     
-    return results
+    def __init__(self, rows, count):
+        self.rows = rows
+        self.count = count
 
+
+def execute_pql(query_string, limit=100):
+    """
+    Main function to execute a PQL query
+    Returns a QueryResult holding the rows as a list
+    
+    Args:
+        query_string: PQL query string
+        limit: Maximum number of results (default 100, max 5000)
+    """
+    plan, _ = compile_pql(query_string)
+    rows = list(run_plan(plan, limit=limit))
+    return QueryResult(rows, len(rows))
@@ -0,0 +1,19 @@
+"""
+Dark Knight Phantom SIEM - Query Database Router
+Sends query history writes to the 'history' database alias
+"""
+
+
+class QueryHistoryRouter:
+    """Route QueryHistory writes to the 'history' connection, reads stay on default"""
+
+    def db_for_write(self, model, **hints):
+        if model._meta.label == 'query.QueryHistory':
+            return 'history'
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 'history' is the same database as default, migrate it once
+        if db == 'history':
+            return False
+        return None
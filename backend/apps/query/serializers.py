@@ -12,6 +12,17 @@ class SavedQuerySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'last_run_at', 'run_count']
 
 
+# Model columns shown when listing saved queries
+SAVED_QUERY_LIST_FIELDS = ['id', 'name', 'query', 'updated_at', 'last_run_at', 'run_count']
+
+
+class SavedQueryListSerializer(serializers.ModelSerializer):
+    """Lightweight serializer for the saved query list"""
+    class Meta:
+        model = SavedQuery
+        fields = SAVED_QUERY_LIST_FIELDS
+
+
 class QueryHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = QueryHistory
@@ -19,10 +30,25 @@ class QueryHistorySerializer(serializers.ModelSerializer):
         read_only_fields = ['executed_at']
 
 
+# Model columns shown when listing query history, error_message is
+# only returned for a single entry
+HISTORY_LIST_FIELDS = [
+    'id', 'query', 'executed_at', 'execution_time_ms',
+    'result_count', 'was_successful', 'executed_by'
+]
+
+
+class QueryHistoryListSerializer(serializers.ModelSerializer):
+    """Lightweight serializer for the query history list"""
+    class Meta:
+        model = QueryHistory
+        fields = HISTORY_LIST_FIELDS
+
+
 class PQLQuerySerializer(serializers.Serializer):
-    """Serializer for PQL query execution"""
+    """Request shape for PQL query execution, PQLExecuteView checks it by hand"""
     query = serializers.CharField()
-    limit = serializers.IntegerField(required=False, default=100, max_value=5000)
+    limit = serializers.IntegerField(required=False, default=100, min_value=1, max_value=5000)
     save_history = serializers.BooleanField(required=False, default=True)
 
 
@@ -0,0 +1,258 @@
+"""
+Dark Knight Phantom SIEM - Query Tests
+"""
+import orjson
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from apps.events.models import EventSource, SecurityEvent
+
+from .pql_engine import _NEVER, PQLExecutor, PQLLexer, PQLParser, PQLSyntaxError, _like_lookup, execute_pql
+from .serializers import PQLQuerySerializer
+from .views import PQLExecuteView
+
+
+def where(conditions):
+    """Parse a WHERE clause and build its Q object"""
+    types, values = PQLLexer(f'SEARCH WHERE {conditions}').tokenize()
+    ast = PQLParser(types, values).parse()
+    return PQLExecutor()._build_q_objects(ast['conditions'])
+
+
+class WhereClauseTests(SimpleTestCase):
+    """Precedence and grouping of WHERE conditions"""
+
+    def assertWhere(self, conditions, expected):
+        q, has_valid = where(conditions)
+        self.assertTrue(has_valid)
+        self.assertEqual(q, expected)
+
+    def test_and_binds_tighter_than_or(self):
+        self.assertWhere(
+            'hostname = "a" OR hostname = "b" AND event_id = 1',
+            Q(hostname='a') | (Q(hostname='b') & Q(event_id=1)),
+        )
+        self.assertWhere(
+            'hostname = "a" AND event_id = 1 OR hostname = "b"',
+            (Q(hostname='a') & Q(event_id=1)) | Q(hostname='b'),
+        )
+
+    def test_parentheses_group(self):
+        self.assertWhere(
+            '(hostname = "a" OR hostname = "b") AND event_id = 1',
+            (Q(hostname='a') | Q(hostname='b')) & Q(event_id=1),
+        )
+        self.assertWhere(
+            'event_id = 1 AND ((hostname = "a"))',
+            Q(event_id=1) & Q(hostname='a'),
+        )
+
+    def test_not_binds_to_the_next_operand(self):
+        self.assertWhere(
+            'NOT hostname = "a" AND event_id = 1',
+            ~Q(hostname='a') & Q(event_id=1),
+        )
+        self.assertWhere(
+            'NOT (hostname = "a" OR event_id = 1)',
+            ~(Q(hostname='a') | Q(event_id=1)),
+        )
+        # "a NOT b" reads as "a AND NOT b"
+        self.assertWhere(
+            'event_id = 1 NOT hostname = "a" OR event_id = 2',
+            (Q(event_id=1) & ~Q(hostname='a')) | Q(event_id=2),
+        )
+
+    def test_aliases_map_to_columns(self):
+        self.assertWhere('user = "bob" AND cmd CONTAINS "whoami"',
+                         Q(user_name='bob') & Q(command_line__icontains='whoami'))
+
+    def test_contains_searches_the_named_column(self):
+        self.assertWhere('msg CONTAINS "logon"', Q(message__icontains='logon'))
+        self.assertWhere('xml CONTAINS "4625" OR data CONTAINS "bob"',
+                         Q(raw_xml__icontains='4625') | Q(event_data__icontains='bob'))
+
+    def test_invalid_fields_drop_out(self):
+        self.assertWhere('bogus = 1 OR hostname = "a"', Q(hostname='a'))
+        self.assertWhere('NOT bogus = 1 AND event_id = 1', Q(event_id=1))
+        self.assertEqual(where('bogus = 1 OR nope = 2'), (None, False))
+
+    def test_unclosed_paren_is_a_syntax_error(self):
+        with self.assertRaises(PQLSyntaxError):
+            where('(hostname = "a" OR event_id = 1')
+        with self.assertRaises(PQLSyntaxError):
+            where('NOT (hostname = "a" AND (event_id = 1)')
+
+
+class ContradictionTests(TestCase):
+    """AND chains whose = / IN terms can't all hold skip the database"""
+
+    @classmethod
+    def setUpTestData(cls):
+        SecurityEvent.objects.create(
+            event_id=4625,
+            timestamp=timezone.now(),
+            channel='Security',
+            hostname='PQLTEST02',
+        )
+
+    def test_contradictory_chain_returns_nothing_without_a_query(self):
+        for conditions in (
+            'event_id = 4625 AND event_id = 4624',
+            'hostname = "PQLTEST02" AND hostname IN ("a", "b")',
+            'hostname IN ("PQLTEST02", "a") AND event_id = 4625 AND hostname IN ("b", "c")',
+        ):
+            with self.subTest(conditions=conditions):
+                self.assertEqual(where(conditions), (_NEVER, True))
+                with self.assertNumQueries(0):
+                    self.assertEqual(execute_pql(f'SEARCH WHERE {conditions}').rows, [])
+
+    def test_satisfiable_conditions_still_query(self):
+        for conditions in (
+            'hostname = "PQLTEST02" AND hostname = "PQLTEST02"',
+            'hostname IN ("PQLTEST02", "a") AND hostname = "PQLTEST02"',
+            'hostname = "PQLTEST02" AND event_id = 4625',
+            'hostname = "PQLTEST02" AND (event_id = 4625 OR event_id = 4624)',
+            '(hostname = "a" OR hostname = "PQLTEST02") AND hostname = "PQLTEST02"',
+            'NOT hostname = "a" AND hostname = "PQLTEST02"',
+            # Compared by the database, which casts "4625" to a number
+            'event_id = 4625 AND event_id = "4625" AND hostname = "PQLTEST02"',
+        ):
+            with self.subTest(conditions=conditions):
+                self.assertNotEqual(where(conditions)[0], _NEVER)
+                rows = execute_pql(f'SEARCH FIELDS hostname WHERE {conditions}').rows
+                self.assertEqual([row['hostname'] for row in rows], ['PQLTEST02'])
+
+
+class LikePatternTests(SimpleTestCase):
+    """LIKE patterns match the whole value, ignoring case"""
+
+    def test_simple_patterns_use_anchored_lookups(self):
+        cases = {
+            'abc%': ('istartswith', 'abc'),
+            '%abc': ('iendswith', 'abc'),
+            '%abc%': ('icontains', 'abc'),
+            'abc': ('iexact', 'abc'),
+            # Regex metacharacters in a simple pattern are plain text to these lookups
+            'a.b*(c)%': ('istartswith', 'a.b*(c)'),
+        }
+        for pattern, expected in cases.items():
+            with self.subTest(pattern=pattern):
+                self.assertEqual(_like_lookup(pattern), expected)
+
+    def test_other_patterns_become_anchored_regexes(self):
+        cases = {
+            'a_c': r'^a.c$',
+            '%a%b%': r'^.*a.*b.*$',
+            # Metacharacters are escaped, only % and _ are wildcards
+            'C:\\Win_ows\\%.exe': r'^C:\\Win.ows\\.*\.exe$',
+            'a.b_(c)+': r'^a\.b.\(c\)\+$',
+        }
+        for pattern, expected in cases.items():
+            with self.subTest(pattern=pattern):
+                self.assertEqual(_like_lookup(pattern), ('regex', expected))
+
+    def test_like_condition(self):
+        self.assertEqual(where('process LIKE "%.EXE"'), (Q(process_name__iendswith='.EXE'), True))
+
+
+class RequestValidationTests(SimpleTestCase):
+    """PQLExecuteView._validate gives the same values and errors as PQLQuerySerializer"""
+
+    BODIES = [
+        {'query': 'SEARCH'},
+        {'query': '  SEARCH  ', 'limit': '50', 'save_history': 'false'},
+        {'query': 'SEARCH', 'limit': 50.0, 'save_history': 0},
+        {'query': 'SEARCH', 'limit': ' 7 ', 'save_history': 'Yes'},
+        {'query': 'SEARCH', 'limit': '12.0', 'save_history': 1.0},
+        {'query': 123, 'limit': 5000},
+        {},
+        {'query': None, 'limit': None, 'save_history': None},
+        {'query': '   ', 'limit': 0},
+        {'query': True, 'limit': -1, 'save_history': 'maybe'},
+        {'query': ['SEARCH'], 'limit': '-1', 'save_history': 'tRuE'},
+        {'query': {'q': 1}, 'limit': 5001, 'save_history': []},
+        {'query': 'SEARCH', 'limit': 12.5},
+        {'query': 'SEARCH', 'limit': True},
+        {'query': 'SEARCH', 'limit': 'ten'},
+        {'query': 'SEARCH', 'limit': [1]},
+        {'query': 'SEARCH', 'limit': '1' * 1001},
+    ]
+
+    def test_matches_serializer(self):
+        for body in self.BODIES:
+            with self.subTest(body=body):
+                query, limit, save_history, errors = PQLExecuteView()._validate(body)
+                serializer = PQLQuerySerializer(data=body)
+
+                if serializer.is_valid():
+                    self.assertEqual(errors, {})
+                    self.assertEqual((query, limit, save_history), (
+                        serializer.validated_data['query'],
+                        serializer.validated_data['limit'],
+                        serializer.validated_data['save_history'],
+                    ))
+                else:
+                    self.assertEqual(errors, serializer.errors)
+
+
+class PQLExecuteTests(TestCase):
+    """Request handling of the PQL execute endpoint"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.source = EventSource.objects.create(name='Security')
+        cls.event = SecurityEvent.objects.create(
+            event_id=4625,
+            timestamp=timezone.now(),
+            channel='Security',
+            hostname='PQLTEST01',
+            source=cls.source,
+        )
+
+    def execute(self, body):
+        return self.client.post('/api/v1/query/execute/', body, content_type='application/json')
+
+    def results(self, response):
+        self.assertEqual(response.status_code, 200)
+        return orjson.loads(b''.join(response.streaming_content))['results']
+
+    def test_fields_select_foreign_keys_by_id_column(self):
+        response = self.execute({'query': 'SEARCH FIELDS hostname, source WHERE hostname = "PQLTEST01"',
+                                 'save_history': False})
+
+        self.assertEqual(self.results(response), [
+            {'id': self.event.id, 'hostname': 'PQLTEST01', 'source_id': self.source.id},
+        ])
+
+    def test_unknown_field_is_a_syntax_error(self):
+        response = self.execute({'query': 'SEARCH FIELDS hostname, nope', 'save_history': False})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error_type'], 'syntax_error')
+        self.assertEqual(response.json()['message'], 'Unknown field: nope')
+
+    def test_limit_below_one_is_rejected(self):
+        for limit in (0, -1, '-1'):
+            with self.subTest(limit=limit):
+                response = self.execute({'query': 'SEARCH', 'limit': limit})
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['details'], {
+                    'limit': ['Ensure this value is greater than or equal to 1.'],
+                })
+
+    def test_like_matches_whole_value_ignoring_case(self):
+        for pattern, matches in (('pqltest_1', True), ('pqltest%', True), ('pqltest', False), ('%test_', False)):
+            with self.subTest(pattern=pattern):
+                response = self.execute({'query': f'SEARCH FIELDS hostname WHERE hostname LIKE "{pattern}"',
+                                         'save_history': False})
+
+                hostnames = {row['hostname'] for row in self.results(response)}
+                self.assertEqual('PQLTEST01' in hostnames, matches)
+
+    def test_null_limit_is_rejected(self):
+        response = self.execute({'query': 'SEARCH', 'limit': None})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['details'], {'limit': ['This field may not be null.']})
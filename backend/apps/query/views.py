@@ -2,20 +2,38 @@
 Dark Knight Phantom SIEM - Query Views
 PQL Query execution endpoints
 """
-from rest_framework import viewsets, status
+from rest_framework import serializers, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.http.request import RawPostDataException
 from django.utils import timezone
+import itertools
+import json
 import time
 import logging
 
+from apps.core.renderers import ORJSONRenderer
+
+from . import history_queue
 from .models import SavedQuery, QueryHistory
-from .serializers import SavedQuerySerializer, QueryHistorySerializer, PQLQuerySerializer
-from .pql_engine import execute_pql, PQLSyntaxError, PQLExecutionError
+from .serializers import (
+    SavedQuerySerializer, SavedQueryListSerializer, QueryHistorySerializer,
+    QueryHistoryListSerializer, SAVED_QUERY_LIST_FIELDS, HISTORY_LIST_FIELDS,
+)
+from .pql_engine import execute_pql, compile_pql, run_plan, PQLSyntaxError, PQLExecutionError
 
 logger = logging.getLogger(__name__)
 
+# Parsing rules of the PQLQuerySerializer fields, which _validate mirrors
+_TRUE_VALUES = serializers.BooleanField.TRUE_VALUES
+_FALSE_VALUES = serializers.BooleanField.FALSE_VALUES
+_TRAILING_ZEROS_RE = serializers.IntegerField.re_decimal
+_MAX_STRING_LENGTH = serializers.IntegerField.MAX_STRING_LENGTH
+_NULL_ERROR = 'This field may not be null.'
+
 
 class PQLExecuteView(APIView):
     """Execute PQL queries"""
@@ -23,69 +41,51 @@ class PQLExecuteView(APIView):
     def post(self, request):
         # Handle both JSON and form data
         if hasattr(request, 'data') and request.data:
-            serializer = PQLQuerySerializer(data=request.data)
+            data = request.data
         else:
             # Fallback to raw JSON
-            import json
             try:
                 data = json.loads(request.body) if hasattr(request, 'body') else {}
-                serializer = PQLQuerySerializer(data=data)
-            except:
+            except (RawPostDataException, ValueError):
                 return Response(
                     {'error': 'Invalid request format', 'message': 'Expected JSON with "query" field'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
-        if not serializer.is_valid():
-            logger.error(f"PQL serializer errors: {serializer.errors}")
-            return Response(
-                {'status': 'error', 'error_type': 'validation_error', 'message': 'Invalid request', 'details': serializer.errors},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        query_string = serializer.validated_data.get('query', '')
-        if not query_string:
+        query_string, limit, save_history, errors = self._validate(data)
+        if errors:
+            logger.error("PQL request errors: %s", errors)
             return Response(
-                {'status': 'error', 'error_type': 'validation_error', 'message': 'Query string is required'},
+                {'status': 'error', 'error_type': 'validation_error', 'message': 'Invalid request', 'details': errors},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        save_history = serializer.validated_data.get('save_history', True)
-        
-        logger.info(f"Executing PQL query: {query_string[:100]}")
-        start_time = time.time()
+        logger.debug("Executing PQL query: %s", query_string[:100])
+        start_ns = time.monotonic_ns()
         
         try:
-            limit = serializer.validated_data.get('limit', 100)
-            results = execute_pql(query_string, limit=limit)
-            execution_time = int((time.time() - start_time) * 1000)
-            logger.info(f"PQL query executed successfully in {execution_time}ms, returned {len(results) if isinstance(results, list) else 1} results")
-            
-            # Save to history
-            if save_history:
-                QueryHistory.objects.create(
-                    query=query_string,
-                    execution_time_ms=execution_time,
-                    result_count=len(results) if isinstance(results, list) else 1,
-                    was_successful=True,
-                )
+            plan, cached = compile_pql(query_string)
+            rows = run_plan(plan, limit=limit)
+            # Fetch the first row here so database errors still get an error response
+            first = next(rows, None)
+            if first is not None:
+                rows = itertools.chain((first,), rows)
             
-            return Response({
-                'status': 'success',
-                'query': query_string,
-                'execution_time_ms': execution_time,
-                'result_count': len(results) if isinstance(results, list) else 1,
-                'results': results,
-            })
+            response = StreamingHttpResponse(
+                self._stream_results(query_string, rows, start_ns, save_history),
+                content_type='application/json',
+            )
+            response['X-PQL-Cache'] = 'hit' if cached else 'miss'
+            return response
             
         except PQLSyntaxError as e:
             if save_history:
-                QueryHistory.objects.create(
+                history_queue.put(QueryHistory(
                     query=query_string,
-                    execution_time_ms=int((time.time() - start_time) * 1000),
+                    execution_time_ms=(time.monotonic_ns() - start_ns) // 1_000_000,
                     was_successful=False,
                     error_message=str(e),
-                )
+                ))
             
             return Response({
                 'status': 'error',
@@ -96,12 +96,12 @@ class PQLExecuteView(APIView):
             
         except PQLExecutionError as e:
             if save_history:
-                QueryHistory.objects.create(
+                history_queue.put(QueryHistory(
                     query=query_string,
-                    execution_time_ms=int((time.time() - start_time) * 1000),
+                    execution_time_ms=(time.monotonic_ns() - start_ns) // 1_000_000,
                     was_successful=False,
                     error_message=str(e),
-                )
+                ))
             
             return Response({
                 'status': 'error',
@@ -111,15 +111,15 @@ class PQLExecuteView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
         except Exception as e:
-            logger.exception(f"PQL execution error: {str(e)}")
-            execution_time = int((time.time() - start_time) * 1000)
+            logger.exception("PQL execution error: %s", e)
+            execution_time = (time.monotonic_ns() - start_ns) // 1_000_000
             if save_history:
-                QueryHistory.objects.create(
+                history_queue.put(QueryHistory(
                     query=query_string,
                     execution_time_ms=execution_time,
                     was_successful=False,
                     error_message=str(e),
-                )
+                ))
             return Response({
                 'status': 'error',
                 'error_type': 'internal_error',
@@ -128,6 +128,88 @@ class PQLExecuteView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+    def _validate(self, data):
+        """
+        Check the request body by hand, the shape is too small to be worth
+        a serializer pass on every query
+        Returns (query, limit, save_history, errors) with the values and
+        errors PQLQuerySerializer would give
+        """
+        if not isinstance(data, dict):
+            return None, None, None, {'non_field_errors': ['Invalid data. Expected a dictionary.']}
+        
+        errors = {}
+        
+        query_string = data.get('query')
+        if 'query' not in data:
+            errors['query'] = ['This field is required.']
+        elif query_string is None:
+            errors['query'] = [_NULL_ERROR]
+        elif isinstance(query_string, bool) or not isinstance(query_string, (str, int, float)):
+            errors['query'] = ['Not a valid string.']
+        else:
+            query_string = str(query_string).strip()
+            if not query_string:
+                errors['query'] = ['This field may not be blank.']
+        
+        limit = data.get('limit', 100)
+        if limit is None:
+            errors['limit'] = [_NULL_ERROR]
+        elif isinstance(limit, str) and len(limit) > _MAX_STRING_LENGTH:
+            errors['limit'] = ['String value too large.']
+        elif limit.__class__ is not int:
+            try:
+                limit = int(_TRAILING_ZEROS_RE.sub('', str(limit)))
+            except ValueError:
+                errors['limit'] = ['A valid integer is required.']
+        if 'limit' not in errors:
+            if limit > 5000:
+                errors['limit'] = ['Ensure this value is less than or equal to 5000.']
+            elif limit < 1:
+                errors['limit'] = ['Ensure this value is greater than or equal to 1.']
+        
+        save_history = data.get('save_history', True)
+        if save_history is None:
+            errors['save_history'] = [_NULL_ERROR]
+        elif save_history.__class__ is not bool:
+            if isinstance(save_history, str):
+                save_history = save_history.lower()
+            try:
+                if save_history in _TRUE_VALUES:
+                    save_history = True
+                elif save_history in _FALSE_VALUES:
+                    save_history = False
+                else:
+                    errors['save_history'] = ['Must be a valid boolean.']
+            except TypeError:
+                errors['save_history'] = ['Must be a valid boolean.']
+        
+        return query_string, limit, save_history, errors
+
+    def _stream_results(self, query_string, rows, start_ns, save_history):
+        """
+        Yield the success response body as rows are fetched
+        result_count and execution_time_ms are only known once every row is sent,
+        so they follow the results array
+        """
+        renderer = ORJSONRenderer()
+        yield b'{"status":"success","query":' + renderer.render(query_string) + b',"results":'
+        result_count = yield from renderer.render_stream(rows)
+        execution_time = (time.monotonic_ns() - start_ns) // 1_000_000
+        yield b',"result_count":%d,"execution_time_ms":%d}' % (result_count, execution_time)
+        
+        logger.debug("PQL query executed successfully in %dms, returned %d results", execution_time, result_count)
+        
+        # Save to history
+        if save_history:
+            history_queue.put(QueryHistory(
+                query=query_string,
+                execution_time_ms=execution_time,
+                result_count=result_count,
+                was_successful=True,
+            ))
+
+
 class SavedQueryViewSet(viewsets.ModelViewSet):
     """API endpoints for saved queries"""
     queryset = SavedQuery.objects.all()
@@ -135,37 +217,49 @@ class SavedQueryViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description', 'query']
     ordering = ['-updated_at']
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = queryset.only(*SAVED_QUERY_LIST_FIELDS)
+        return queryset
+    
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return SavedQueryListSerializer
+        return SavedQuerySerializer
+    
     @action(detail=True, methods=['post'])
     def run(self, request, pk=None):
         """Run a saved query"""
         saved_query = self.get_object()
         
-        start_time = time.time()
+        start_ns = time.monotonic_ns()
         
         try:
-            results = execute_pql(saved_query.query)
-            execution_time = int((time.time() - start_time) * 1000)
+            result = execute_pql(saved_query.query)
+            execution_time = (time.monotonic_ns() - start_ns) // 1_000_000
             
-            # Update run count
-            saved_query.run_count += 1
-            saved_query.last_run_at = timezone.now()
-            saved_query.save()
+            # Update run count in a single UPDATE, without a full-row save()
+            SavedQuery.objects.filter(pk=saved_query.pk).update(
+                run_count=F('run_count') + 1,
+                last_run_at=timezone.now(),
+            )
             
             # Save to history
-            QueryHistory.objects.create(
+            history_queue.put(QueryHistory(
                 query=saved_query.query,
                 execution_time_ms=execution_time,
-                result_count=len(results) if isinstance(results, list) else 1,
+                result_count=result.count,
                 was_successful=True,
-            )
+            ))
             
             return Response({
                 'status': 'success',
                 'query_name': saved_query.name,
                 'query': saved_query.query,
                 'execution_time_ms': execution_time,
-                'result_count': len(results) if isinstance(results, list) else 1,
-                'results': results,
+                'result_count': result.count,
+                'results': result.rows,
             })
             
         except (PQLSyntaxError, PQLExecutionError) as e:
@@ -180,4 +274,15 @@ class QueryHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = QueryHistory.objects.all()
     serializer_class = QueryHistorySerializer
     ordering = ['-executed_at']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = queryset.only(*HISTORY_LIST_FIELDS)
+        return queryset
+    
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return QueryHistoryListSerializer
+        return QueryHistorySerializer
 
@@ -6,14 +6,22 @@ Enterprise Security Information and Event Management System
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'dkp-siem-secret-key-change-in-production-x7k9m2n4p6q8r0s3t5v7w9y1z3'
-
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DEBUG also records every SQL query on each connection, set DJANGO_DEBUG=1
+# for development only
+DEBUG = os.environ.get('DJANGO_DEBUG', '0') == '1'
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    if not DEBUG:
+        raise ImproperlyConfigured("Set DJANGO_SECRET_KEY (or DJANGO_DEBUG=1 for development)")
+    SECRET_KEY = 'dkp-siem-secret-key-change-in-production-x7k9m2n4p6q8r0s3t5v7w9y1z3'
 
 ALLOWED_HOSTS = ['*']
 
@@ -41,6 +49,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    # Compresses PQL/event JSON, streamed responses are compressed chunk by chunk
+    'django.middleware.gzip.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,11 +96,41 @@ DATABASES = {
         'PORT': '5432',
         'OPTIONS': {
             'connect_timeout': 10,
+            # Bind parameters server-side so psycopg prepares a statement
+            # once the same SQL has run prepare_threshold times on a
+            # connection, repeated PQL query shapes are then planned once
+            'server_side_binding': True,
+            'prepare_threshold': 5,
+            # psycopg 3 connection pool, replaces CONN_MAX_AGE persistent
+            # connections (Django rejects both together)
+            'pool': {
+                'min_size': 4,
+                'max_size': 20,
+                'timeout': 10,
+            },
         },
-        'CONN_MAX_AGE': 600,
     }
 }
 
+# Query history is secondary telemetry, its batches are written over their
+# own connections with synchronous_commit off so they never wait on a WAL
+# flush. A crash can lose the last few history rows, never event data
+DATABASES['history'] = {
+    **DATABASES['default'],
+    'OPTIONS': {
+        **DATABASES['default']['OPTIONS'],
+        'options': '-c synchronous_commit=off',
+        'pool': {
+            'min_size': 1,
+            'max_size': 2,
+            'timeout': 10,
+        },
+    },
+    'TEST': {'MIRROR': 'default'},
+}
+
+DATABASE_ROUTERS = ['apps.query.routers.QueryHistoryRouter']
+
 # Password validation - Disabled for lab
 AUTH_PASSWORD_VALIDATORS = []
 
@@ -124,18 +164,32 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100,
+    'DEFAULT_PARSER_CLASSES': [
+        'apps.core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'apps.core.renderers.ORJSONRenderer',
     ],
     'UNAUTHENTICATED_USER': None,
 }
 
+# The browsable API renders HTML forms for every browser request, keep it
+# for development only
+if DEBUG:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('rest_framework.renderers.BrowsableAPIRenderer')
+
 # Dark Knight Phantom SIEM Settings
 PHANTOM_SIEM = {
     'AGENT_HEARTBEAT_INTERVAL': 30,  # seconds
     'EVENT_BATCH_SIZE': 1000,
     'MAX_EVENTS_PER_REQUEST': 5000,
+    # 'direct': bulk insert + detection in the request
+    # 'staging': COPY into security_events_staging, drained by `manage.py drain_event_staging`
+    # 'queue': append raw batches to a Redis stream, drained by `manage.py consume_event_stream`
+    'INGEST_MODE': os.environ.get('PHANTOM_INGEST_MODE', 'direct'),
+    'INGEST_QUEUE_URL': os.environ.get('PHANTOM_INGEST_QUEUE_URL', 'redis://localhost:6379/0'),
     'EVENT_RETENTION_DAYS': 90,
     'ALERT_SEVERITY_LEVELS': ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL'],
     'THEME': {
@@ -170,7 +224,8 @@ LOGGING = {
     },
     'handlers': {
         'console': {
-            'class': 'logging.StreamHandler',
+            # Writes to stderr from a listener thread, off the request path
+            'class': 'apps.core.log_handlers.QueuedStreamHandler',
             'formatter': 'verbose',
         },
     },
@@ -186,7 +241,7 @@ LOGGING = {
         },
         'apps': {
             'handlers': ['console'],
-            'level': 'DEBUG',
+            'level': 'INFO',
             'propagate': False,
         },
     },
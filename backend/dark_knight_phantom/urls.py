@@ -3,23 +3,32 @@ Dark Knight Phantom SIEM - URL Configuration
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.http import JsonResponse
+from django.http import HttpResponse
+import orjson
+
+
+# The API root never changes while the process runs, so encode it once
+API_ROOT_BODY = orjson.dumps({
+    'name': 'Dark Knight Phantom SIEM',
+    'version': '1.0.0',
+    'endpoints': {
+        'events': '/api/v1/events/',
+        'agents': '/api/v1/agents/',
+        'alerts': '/api/v1/alerts/',
+        'query': '/api/v1/query/',
+        'dashboard': '/api/v1/dashboard/',
+        'detection': '/api/v1/detection/',
+    }
+})
 
 
 def api_root(request):
     """API Root endpoint"""
-    return JsonResponse({
-        'name': 'Dark Knight Phantom SIEM',
-        'version': '1.0.0',
-        'endpoints': {
-            'events': '/api/v1/events/',
-            'agents': '/api/v1/agents/',
-            'alerts': '/api/v1/alerts/',
-            'query': '/api/v1/query/',
-            'dashboard': '/api/v1/dashboard/',
-            'detection': '/api/v1/detection/',
-        }
-    })
+    return HttpResponse(
+        API_ROOT_BODY,
+        content_type='application/json',
+        headers={'Cache-Control': 'public, max-age=300'},
+    )
 
 
 urlpatterns = [